@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.telegram_account import TelegramAccount
 from app.models.user import User
 from app.schemas.auth import UserCreate, UserLogin, UserResponse
@@ -12,23 +12,23 @@ from app.services.auth import AuthService
 router = APIRouter()
 
 
-def get_user_service(db: Session = Depends(get_db)):
+def get_user_service(db: AsyncSession = Depends(get_db)):
     return AuthService(db)
 
 
 @router.post("/register")
-def register(user: UserCreate, service: AuthService = Depends(get_user_service)):
-    return service.register(user)
+async def register(user: UserCreate, service: AuthService = Depends(get_user_service)):
+    return await service.register(user)
 
 
 @router.post("/login", response_model=Token)
-def login(data: UserLogin, service: AuthService = Depends(get_user_service)):
-    return service.login(data)
+async def login(data: UserLogin, service: AuthService = Depends(get_user_service)):
+    return await service.login(data)
 
 
 @router.get("/refresh-user", response_model=UserResponse)
-def refresh_user(user=Depends(get_current_user), service: AuthService = Depends(get_user_service)):
-    account = service.refresh_user(user.id)
+async def refresh_user(user=Depends(get_current_user), service: AuthService = Depends(get_user_service)):
+    account = await service.refresh_user(user.id)
 
     is_telegram_auth = False
 
@@ -1,30 +1,37 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Literal, Optional, Union
+
+import orjson
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import FileResponse, StreamingResponse
 
 from app.api.auth import get_user_service
+from app.core.cursor import decode_cursor
+from app.core.etag import etag_matches, not_modified
+from app.core.media_cache import MediaFile
 from app.core.jwt import create_access_token
 from app.models.telegram_account import TelegramAccount
-from app.schemas.telegram import PhoneAuthRequest, PhoneCodeVerifyRequest,  TwoFactorAuthRequest
-from app.deps import get_current_user, get_db, get_telegram_service
+from app.schemas.telegram import Chat, MessageBatchRequest, MessagePage, MessageSearchResult, PhoneAuthRequest, PhoneCodeVerifyRequest, TelegramStatus, TwoFactorAuthRequest
+from app.db import SessionLocal
+from app.deps import get_current_user, get_db, get_principal, get_telegram_service, get_update_hub
 from app.services.auth import AuthService
+from app.services.telegram_sync import sync_worker
 
 
 router = APIRouter()
 
+# NDJSON streams hand out each line as soon as it is ready, which zlib's
+# buffering would hold back: identity encoding keeps GZip away from them
+NDJSON_HEADERS = {"Content-Encoding": "identity"}
+
 
 @router.post("/auth/start")
 async def start_telegram_auth(request: PhoneAuthRequest, service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
-    result = await telegram_service.start_authorization(request.phone_number)
+    result = await telegram_service.start_authorization(user.id, request.phone_number)
     if result.get("status") == "code_sent":
-        account = service.refresh_user(user.id)
-        session_string = result.get("session_string")
-
-        if not account:
-            account = service.create_telegram_account(
-                session_string, user.id, False)
-
-        service.telegram_repo.update_telegram_account(
-            session_string, user.id, False)
+        await service.upsert_telegram_account(
+            result.get("session_string"), user.id, False)
 
     return result
 
@@ -32,6 +39,7 @@ async def start_telegram_auth(request: PhoneAuthRequest, service: AuthService =
 @router.post("/auth/verify-code")
 async def verify_telegram_code(request: PhoneCodeVerifyRequest, service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
     result = await telegram_service.verify_phone_code(
+        user.id,
         request.phone_number,
         request.phone_code,
         request.phone_code_hash,
@@ -39,72 +47,209 @@ async def verify_telegram_code(request: PhoneCodeVerifyRequest, service: AuthSer
     )
 
     if result.get("status") == "success":
-        account = service.refresh_user(user.id)
-        session_string = result.get("session_string")
-
-        if not account:
-            account = service.create_telegram_account(
-                session_string, user.id, False)
-
-        service.telegram_repo.update_telegram_account(
-            session_string, user.id, True)
+        await service.upsert_telegram_account(
+            result.get("session_string"), user.id, True)
 
     return result
 
 
 @router.post("/auth/verify-2fa")
 async def verify_two_factor(request: TwoFactorAuthRequest, service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
-    result = await telegram_service.verify_2fa_password(request.password, request.session_string)
+    result = await telegram_service.verify_2fa_password(user.id, request.password, request.session_string)
 
     if result.get("status") == "success":
-        account = service.refresh_user(user.id)
-        session_string = result.get("session_string")
-
-        if not account:
-            account = service.create_telegram_account(
-                session_string, user.id, False)
-
-        service.telegram_repo.update_telegram_account(
-            session_string, user.id, True)
+        await service.upsert_telegram_account(
+            result.get("session_string"), user.id, True)
 
     return result
 
 
 @router.get("/disconnect")
 async def disconnect_telegram(service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
-    account = service.refresh_user(user.id)
+    account = user.telegram_account
 
     if not account or not account.is_telegram_auth:
         return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
 
-    telegram_service.logout(account.session_string)
+    await telegram_service.logout(user.id, account.session_string)
+    sync_worker.forget(user.id)
 
-    service.telegram_repo.delete_telegram_account(user.id)
+    await service.delete_telegram_account(user.id)
 
     access_token = create_access_token(data={"sub": user.email})
 
     return {"isTelegramAuth": False, "token": access_token, "message": "Telegram account disconnected"}
 
 
-@router.get("/chats")
-async def get_chats_telegram(service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
-    account = service.refresh_user(user.id)
+@router.get("/chats", response_model=Union[list[Chat], TelegramStatus])
+async def get_chats_telegram(response: Response, if_none_match: Optional[str] = Header(None), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
 
     if not account or not account.is_telegram_auth:
         return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
 
-    result = await telegram_service.get_chats(account.session_string)
+    sync_worker.touch(user.id, account.session_string)
+
+    # A poller that already has the cached list is answered without
+    # touching Telegram
+    cached = await telegram_service.dialogs.peek(user.id)
+    if cached is not None:
+        etag = telegram_service.chats_etag(cached)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    result = await telegram_service.get_chats(user.id, account.session_string)
+
+    etag = telegram_service.chats_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
 
     return result
 
 
-@router.get("/chats/{chat_id}/messages")
-async def get_messages_telegram(chat_id: int, service: AuthService = Depends(get_user_service), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
-    account = service.refresh_user(user.id)
+@router.get("/chats/{chat_id}/messages", response_model=Union[MessagePage, TelegramStatus])
+async def get_messages_telegram(response: Response, chat_id: int, cursor: Optional[str] = None, before_id: Optional[int] = Query(None, ge=0), after_id: Optional[int] = Query(None, ge=0), limit: int = Query(100, ge=1, le=500), if_none_match: Optional[str] = Header(None), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
 
     if not account or not account.is_telegram_auth:
         return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
 
-    result = await telegram_service.get_messages(chat_id, account.session_string)
+    if cursor:
+        position = decode_cursor(cursor)
+        before_id = position.get("before_id")
+        after_id = position.get("after_id")
+
+    sync_worker.touch(user.id, account.session_string)
+    result = await telegram_service.get_messages(
+        user.id, chat_id, account.session_string, limit=limit, before_id=before_id, after_id=after_id)
+
+    etag = telegram_service.messages_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
 
     return result
+
+
+@router.get("/chats/{chat_id}/messages/{message_id}/media")
+async def get_media_telegram(chat_id: int, message_id: int, size: Literal["original", "small", "medium", "large"] = "original", user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
+
+    if not account or not account.is_telegram_auth:
+        return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
+
+    media = await telegram_service.get_media(
+        user.id, account.session_string, chat_id, message_id, size=size)
+
+    # Media is already compressed: identity encoding keeps GZip away,
+    # which would also break Range requests
+    headers = {"Cache-Control": "private, max-age=86400", "Content-Encoding": "identity"}
+    if isinstance(media, MediaFile):
+        # Served with sendfile where available, including Range requests
+        return FileResponse(media.path, media_type=media.media_type, filename=media.filename,
+                            content_disposition_type="inline", headers=headers)
+
+    return StreamingResponse(media.chunks, media_type=media.media_type, headers=headers)
+
+
+@router.get("/chats/{chat_id}/export")
+async def export_messages_telegram(chat_id: int, from_id: int = Query(0, ge=0), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
+
+    if not account or not account.is_telegram_auth:
+        return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
+
+    chunks = telegram_service.iter_export(user.id, account.session_string, chat_id, from_id=from_id)
+
+    async def lines():
+        try:
+            async for chunk in chunks:
+                yield b"".join(orjson.dumps(message) + b"\n" for message in chunk)
+        except HTTPException as e:
+            # The status line is already sent: report the error as the last
+            # line, and the client resumes from the last id it received
+            yield orjson.dumps({"error": {"status_code": e.status_code, "detail": e.detail}}) + b"\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={**NDJSON_HEADERS, "Content-Disposition": f'attachment; filename="chat-{chat_id}.ndjson"'},
+    )
+
+
+@router.post("/messages/batch")
+async def get_messages_batch_telegram(request: MessageBatchRequest, user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
+
+    if not account or not account.is_telegram_auth:
+        return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
+
+    results = telegram_service.iter_message_batch(
+        user.id, account.session_string, [(chat.chat_id, chat.limit) for chat in request.chats])
+
+    async def lines():
+        async for result in results:
+            yield orjson.dumps(result) + b"\n"
+
+    # One JSON object per chat, in completion order
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=NDJSON_HEADERS)
+
+
+@router.get("/search", response_model=Union[list[MessageSearchResult], TelegramStatus])
+async def search_messages_telegram(q: str = Query(..., min_length=1), chat_id: Optional[int] = None, limit: int = Query(20, ge=1, le=100), user=Depends(get_current_user), telegram_service=Depends(get_telegram_service)):
+    account = user.telegram_account
+
+    if not account or not account.is_telegram_auth:
+        return {"status": "telegram_not_autorize", "message": "Telegram account not authorized"}
+
+    result = await telegram_service.search_messages(user.id, q, chat_id=chat_id, limit=limit)
+
+    return result
+
+
+@router.websocket("/updates")
+async def telegram_updates(websocket: WebSocket, token: str, hub=Depends(get_update_hub)):
+    # Not Depends(get_db): that would hold a pooled connection for as long
+    # as the socket stays open
+    async with SessionLocal() as db:
+        user = await get_principal(token, db)
+    account = user.telegram_account if user else None
+
+    if not account or not account.is_telegram_auth:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+
+    async def forward(queue):
+        while True:
+            update = await queue.get()
+            await websocket.send_json(update)
+            if update["type"] == "error":
+                return
+
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    try:
+        async with hub.subscribe(user.id, account.session_string) as queue:
+            tasks = [asyncio.create_task(forward(queue)), asyncio.create_task(wait_for_disconnect())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+    except Exception as e:
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason=str(getattr(e, "detail", e)))
+        return
+
+    try:
+        await websocket.close()
+    except RuntimeError:
+        # The client already went away
+        pass
@@ -0,0 +1,103 @@
+import secrets
+from urllib.parse import urlsplit
+
+from app.core.cache.memory import MemoryBackend
+from app.core.cache.redis import RedisBackend, RedisError
+from app.core.cache.sqlite import SQLiteBackend
+
+# Generations outlive the entries stamped with them; one that expired
+# anyway only turns those entries into misses
+GENERATION_TTL = 24 * 3600
+
+
+class Cache:
+    """Namespaced view of a cache backend.
+
+    Values must be JSON-compatible, since shared backends store them
+    serialized. ``invalidate`` deletes a key and starts a new generation of
+    it. Values derived from a key can carry the generation they were built
+    under and be ignored once it changed; with a shared backend this also
+    covers the other workers.
+
+    A failing backend is reported and treated as a miss, so the callers
+    fall back to their loaders instead of failing the request.
+    """
+
+    def __init__(self, backend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    async def get(self, key):
+        try:
+            return await self.backend.get(self._key(key))
+        except Exception as e:
+            print("====== Error reading cache ======", self.namespace, e)
+            return None
+
+    async def set(self, key, value, ttl: float):
+        try:
+            await self.backend.set(self._key(key), value, ttl)
+        except Exception as e:
+            print("====== Error writing cache ======", self.namespace, e)
+
+    async def generation(self, key) -> str:
+        generation = await self.get(f"generation:{key}")
+        if generation is None:
+            generation = await self._new_generation(key)
+        return generation
+
+    async def invalidate(self, key):
+        try:
+            await self.backend.delete(self._key(key))
+        except Exception as e:
+            print("====== Error invalidating cache ======", self.namespace, e)
+        await self._new_generation(key)
+
+    async def close(self):
+        await self.backend.close()
+
+    async def _new_generation(self, key) -> str:
+        generation = secrets.token_hex(8)
+        await self.set(f"generation:{key}", generation, GENERATION_TTL)
+        return generation
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+
+_shared_backends: dict = {}
+
+
+def create_backend(url: str, max_size: int = 10000):
+    """Backend for a cache URL.
+
+    ``memory://`` gives every caller an LRU of its own with ``max_size``
+    keys. ``sqlite:///path`` and ``redis://[:password@]host[:port][/db]``
+    are shared by all callers with the same URL, and by all workers using
+    the same database or server.
+    """
+    scheme = url.split("://", 1)[0]
+    if scheme == "memory":
+        return MemoryBackend(max_size)
+
+    backend = _shared_backends.get(url)
+    if backend is None:
+        if scheme == "sqlite":
+            backend = SQLiteBackend(url.split(":///", 1)[1])
+        elif scheme == "redis":
+            parts = urlsplit(url)
+            backend = RedisBackend(
+                host=parts.hostname or "localhost",
+                port=parts.port or 6379,
+                db=int(parts.path.strip("/") or 0),
+                password=parts.password,
+            )
+        else:
+            raise ValueError(f"Unsupported cache URL: {url}")
+        _shared_backends[url] = backend
+    return backend
+
+
+__all__ = [
+    "Cache", "MemoryBackend", "RedisBackend", "RedisError", "SQLiteBackend", "create_backend",
+]
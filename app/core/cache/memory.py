@@ -0,0 +1,34 @@
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """LRU of values in this process, bounded to ``max_size`` keys."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+
+        self._entries: "OrderedDict[str, tuple[object, float]]" = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def close(self):
+        self._entries.clear()
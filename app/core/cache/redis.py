@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+
+import orjson
+
+
+class RedisError(Exception):
+    """Error reply of the server."""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        return RedisError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from Redis: {line!r}")
+
+
+class RedisBackend:
+    """Values on a Redis server, or anything else speaking its protocol.
+
+    One connection is shared by all callers: commands are pipelined and
+    their replies matched to the callers in order. A broken connection
+    fails the commands in flight and is reopened by the next command.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str = None,
+                 timeout: float = 5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+
+        self._writer = None
+        self._reader_task = None
+        self._pending: deque = deque()
+        self._lock = None
+
+    async def get(self, key: str):
+        value = await self.execute("GET", key)
+        return None if value is None else orjson.loads(value)
+
+    async def set(self, key: str, value, ttl: float):
+        await self.execute("SET", key, orjson.dumps(value), "PX", max(int(ttl * 1000), 1))
+
+    async def delete(self, key: str):
+        await self.execute("DEL", key)
+
+    async def execute(self, *args):
+        await self._connect()
+        future = self._send(*args)
+        reply = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._reader_task.cancel()
+        await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._disconnected(ConnectionError("Redis connection closed"))
+
+    def _send(self, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        # Replies of callers that timed out are dropped without a warning
+        future.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._pending.append(future)
+        self._writer.write(encode_command(*args))
+        return future
+
+    async def _connect(self):
+        if self._writer is not None:
+            return
+        # Locks are bound to a loop, so it is created by the first caller
+        self._lock = self._lock or asyncio.Lock()
+        async with self._lock:
+            if self._writer is not None:
+                return
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            setup = []
+            if self.password:
+                setup.append(self._send("AUTH", self.password))
+            if self.db:
+                setup.append(self._send("SELECT", self.db))
+            for reply in await asyncio.gather(*setup):
+                if isinstance(reply, RedisError):
+                    await self.close()
+                    raise reply
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, IndexError) as e:
+            self._disconnected(ConnectionError(f"Redis connection lost: {e}"))
+
+    def _disconnected(self, error: Exception):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._reader_task = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+
+class SQLiteBackend:
+    """Values in a SQLite database in WAL mode, shared by the workers of a host.
+
+    Queries run on a thread of their own, so a write waiting for the lock
+    of another process never blocks the event loop. Expired rows are purged
+    at most every ``purge_interval`` seconds.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60):
+        self.path = path
+        self.purge_interval = purge_interval
+
+        self._executor = None
+        self._db = None
+        self._purged_at = 0
+
+    async def get(self, key: str):
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value, ttl: float):
+        await self._run(self._set, key, orjson.dumps(value), ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._run(self._close)
+        self._executor.shutdown()
+        self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-sqlite")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            # Private to the user running the workers; SQLite gives the WAL
+            # and shared-memory files the same mode
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            os.chmod(self.path, 0o600)
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # A crash may lose the last writes, which a cache can afford
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+            self._db = db
+        return self._db
+
+    def _get(self, key: str):
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        db = self._connect()
+        db.execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, now + ttl))
+        if now - self._purged_at > self.purge_interval:
+            self._purged_at = now
+            db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def _delete(self, key: str):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,24 @@
+import base64
+import json
+from fastapi import HTTPException
+
+# Message ids a cursor may carry
+CURSOR_KEYS = {"before_id", "after_id"}
+
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Cursors come back from clients, so they are checked like any input
+    if not isinstance(data, dict) or not set(data) <= CURSOR_KEYS or not all(
+            type(value) is int and value >= 0 for value in data.values()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
@@ -0,0 +1,67 @@
+import time
+
+from telethon.sessions import StringSession
+
+
+class DatabaseSession(StringSession):
+    """StringSession whose entities and update state outlive the client.
+
+    The connection data (data center and auth key) is still the account's
+    session string. Everything else Telethon learns, such as the access
+    hashes of entities and the pts/qts update state, is kept in the
+    database. Telethon calls sessions synchronously, so the stored data is
+    loaded before the client is created and changes are only recorded in
+    memory until ``TelegramSessionStore.flush`` writes them in one batch.
+    """
+
+    def __init__(self, user_id: int, session_string: str = None, entities=(), update_states: dict = None):
+        super().__init__(session_string)
+        self.user_id = user_id
+        self.deleted = False
+        self.flushed_at = time.monotonic()
+
+        self._rows = {row[0]: row for row in entities}
+        self._entities = set(self._rows.values())
+        self._update_states = dict(update_states or {})
+        self._dirty_entities = {}
+        self._dirty_states = set()
+
+    @property
+    def auth_key_id(self):
+        return f"{self.auth_key.key_id:016x}" if self.auth_key else None
+
+    @property
+    def dirty(self) -> bool:
+        return self.deleted or bool(self._dirty_entities or self._dirty_states)
+
+    def process_entities(self, tlo):
+        for row in self._entities_to_rows(tlo):
+            old = self._rows.get(row[0])
+            if old == row:
+                continue
+            if old:
+                self._entities.discard(old)
+            self._entities.add(row)
+            self._rows[row[0]] = row
+            self._dirty_entities[row[0]] = row
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states.add(entity_id)
+
+    def delete(self):
+        # Called by Telethon on log_out
+        self.deleted = True
+
+    def take_changes(self) -> tuple[dict, dict]:
+        """Changed entity rows and update states since the last call."""
+        entities, self._dirty_entities = self._dirty_entities, {}
+        states = {entity_id: self._update_states[entity_id] for entity_id in self._dirty_states}
+        self._dirty_states = set()
+        self.flushed_at = time.monotonic()
+        return entities, states
+
+    def restore_changes(self, entities: dict, states: dict):
+        """Mark changes whose write failed as dirty again."""
+        self._dirty_entities = entities | self._dirty_entities
+        self._dirty_states |= set(states)
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from app.core import config
+from app.core.cache import Cache, MemoryBackend, create_backend
+from app.core.metrics import CACHE_LOOKUPS
+
+
+class DialogCache:
+    """Per-account dialog lists with stale-while-revalidate semantics.
+
+    A list younger than ``ttl`` is served as is. Up to ``stale_ttl`` seconds
+    after that it is still served immediately while a background task
+    refreshes it; older lists are reloaded before answering.
+
+    Lists are stored in ``cache``, or in memory when none is given, and
+    carry the time they were fetched so that any worker can judge their
+    age. A load only stores its list if the account was not invalidated in
+    the meantime, by this worker or another one.
+    """
+
+    def __init__(self, cache: Cache = None, ttl: float = 30, stale_ttl: float = 600):
+        self.cache = cache or Cache(MemoryBackend(), "dialogs")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._refreshing: dict = {}
+
+    async def get(self, key, loader: Callable[[], Awaitable]):
+        entry = await self.cache.get(key)
+        if entry:
+            age = time.time() - entry["fetched_at"]
+            if age < self.ttl:
+                CACHE_LOOKUPS.labels("dialogs", "hit").inc()
+                return entry["value"]
+            if age < self.ttl + self.stale_ttl:
+                CACHE_LOOKUPS.labels("dialogs", "stale").inc()
+                self._refresh_in_background(key, loader)
+                return entry["value"]
+
+        CACHE_LOOKUPS.labels("dialogs", "miss").inc()
+        return await self._load(key, loader)
+
+    async def refresh(self, key, loader: Callable[[], Awaitable]):
+        """Reload ``key`` now, e.g. from a background sync before it goes stale."""
+        return await self._load(key, loader)
+
+    async def peek(self, key):
+        """The cached list of ``key`` while it is fresh, without loading it."""
+        entry = await self.cache.get(key)
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["value"]
+        return None
+
+    async def invalidate(self, key):
+        """Forget ``key``, including results of loads already in flight."""
+        await self.cache.invalidate(key)
+        task = self._refreshing.pop(key, None)
+        if task:
+            task.cancel()
+
+    async def close(self):
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+        await self.cache.close()
+
+    async def _load(self, key, loader: Callable[[], Awaitable]):
+        generation = await self.cache.generation(key)
+        fetched_at = time.time()
+        value = await loader()
+        if await self.cache.generation(key) == generation:
+            await self.cache.set(key, {"value": value, "fetched_at": fetched_at}, self.ttl + self.stale_ttl)
+        return value
+
+    def _refresh_in_background(self, key, loader: Callable[[], Awaitable]):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._load(key, loader)
+            except Exception as e:
+                # The stale list keeps being served until a refresh succeeds
+                print("====== Error refreshing dialogs ======", e)
+            finally:
+                if self._refreshing.get(key) is task:
+                    del self._refreshing[key]
+
+        task = asyncio.create_task(refresh())
+        self._refreshing[key] = task
+
+
+dialog_cache = DialogCache(
+    Cache(create_backend(config.CACHE_URL), "dialogs"),
+    ttl=config.TELEGRAM_DIALOG_CACHE_TTL,
+    stale_ttl=config.TELEGRAM_DIALOG_CACHE_STALE_TTL,
+)
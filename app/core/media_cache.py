@@ -0,0 +1,141 @@
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from app.core import config
+
+
+@dataclass(frozen=True)
+class MediaFile:
+    """Media available as a file in the cache, served with FileResponse."""
+    path: str
+    media_type: str
+    filename: str
+
+
+@dataclass(frozen=True)
+class MediaStream:
+    """Media streamed while it is downloaded into the cache."""
+    chunks: AsyncIterator[bytes]
+    media_type: str
+    filename: str
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    key: str
+    media_type: str
+    filename: str
+
+
+class MediaCache:
+    """Size-capped LRU of downloaded media on local disk.
+
+    Files are keyed by media id and size variant, so one photo shared in
+    many chats is stored once. Least recently served files are deleted once
+    the directory holds more than ``max_bytes``; access times are written
+    to the files, so the order survives restarts.
+
+    Requests name media by message, so the cache also remembers which media
+    a (user, chat, message, size) resolved to. A repeated request is then
+    served from disk without asking Telegram again.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_aliases: int = 10000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_aliases = max_aliases
+
+        self._files: "OrderedDict[str, int]" = None
+        self._total = 0
+        self._aliases: "OrderedDict[tuple, MediaInfo]" = OrderedDict()
+
+    def contains(self, path: str) -> bool:
+        """Whether ``path`` resolves to a file inside the cache directory."""
+        directory = os.path.realpath(self.directory)
+        return os.path.commonpath([directory, os.path.realpath(path)]) == directory
+
+    def lookup(self, alias: tuple) -> Optional[MediaInfo]:
+        info = self._aliases.get(alias)
+        if info:
+            self._aliases.move_to_end(alias)
+        return info
+
+    def remember(self, alias: tuple, info: MediaInfo):
+        self._aliases[alias] = info
+        self._aliases.move_to_end(alias)
+        while len(self._aliases) > self.max_aliases:
+            self._aliases.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached file of ``key``, marking it recently used."""
+        files = self._index()
+        if key not in files:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._total -= files.pop(key)
+            return None
+        files.move_to_end(key)
+        return path
+
+    def temp_file(self):
+        """An open temporary file in the cache directory, to be committed."""
+        self._index()
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix=".download-", delete=False)
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """Move a finished download into the cache and evict old files."""
+        files = self._index()
+        path = self._path(key)
+        os.replace(temp_path, path)
+        self._total -= files.pop(key, 0)
+        files[key] = os.path.getsize(path)
+        self._total += files[key]
+
+        # The file just added stays even if it alone exceeds the cap
+        while self._total > self.max_bytes and len(files) > 1:
+            old_key, size = files.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+        return path
+
+    @staticmethod
+    def discard(temp_path: str):
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _index(self) -> "OrderedDict[str, int]":
+        if self._files is None:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                if entry.name.startswith(".download-"):
+                    # Left behind by an interrupted download
+                    self.discard(entry.path)
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_atime, entry.name, stat.st_size))
+            self._files = OrderedDict((name, size) for _, name, size in sorted(files))
+            self._total = sum(self._files.values())
+        return self._files
+
+
+media_cache = MediaCache(
+    directory=config.MEDIA_CACHE_DIR,
+    max_bytes=config.MEDIA_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to answer HTTP requests, by route",
+    ["method", "route", "status"])
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being answered", ["method"])
+
+TELEGRAM_CONNECT_DURATION = Histogram(
+    "telegram_connect_duration_seconds", "Time to connect a pooled Telethon client")
+TELEGRAM_CALL_DURATION = Histogram(
+    "telegram_call_duration_seconds", "Time of Telegram operations, by Telethon method",
+    ["method", "outcome"])
+TELEGRAM_CALLS_IN_PROGRESS = Gauge(
+    "telegram_calls_in_progress", "Telegram operations running", ["method"])
+TELEGRAM_POOL_CLIENTS = Gauge(
+    "telegram_pool_clients", "Telethon clients held by the pool", ["state"])
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time of database statements, by statement type", ["statement"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Time of bcrypt operations including queueing", ["operation"])
+PASSWORD_HASHES_IN_PROGRESS = Gauge(
+    "password_hashes_in_progress", "bcrypt operations queued or running")
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups, by cache and result", ["cache", "result"])
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Coalescible calls, by whether they joined one in flight", ["result"])
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+@contextmanager
+def timed(histogram: Histogram, in_progress: Gauge = None, **labels):
+    """Observe the duration of the block, labelled ``outcome`` if the histogram has it."""
+    if in_progress is not None:
+        in_progress.inc()
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        if "outcome" in histogram._labelnames:
+            labels["outcome"] = outcome
+        metric = histogram.labels(**labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
+        if in_progress is not None:
+            in_progress.dec()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Time every statement the engine sends to the database."""
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        DB_QUERY_DURATION.labels(verb if verb in _STATEMENTS else "OTHER").observe(
+            time.perf_counter() - start)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight count of HTTP requests.
+
+    Requests are labelled with the route template rather than the raw path,
+    so ids in URLs do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method, route.path if route else "unmatched", str(status_code)).observe(
+                time.perf_counter() - start)
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
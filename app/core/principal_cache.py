@@ -0,0 +1,102 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from app.core import config
+from app.core.cache import Cache, MemoryBackend, create_backend
+from app.core.metrics import CACHE_LOOKUPS
+
+
+@dataclass(frozen=True)
+class TelegramAccountState:
+    session_string: str
+    is_telegram_auth: bool
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user together with the state of its Telegram account."""
+    id: int
+    email: str
+    telegram_account: Optional[TelegramAccountState] = None
+
+
+class PrincipalCache:
+    """Principals keyed by a hash of their access token.
+
+    An entry lives for ``ttl`` seconds but never past the expiry of its
+    token. Anything that changes a user's Telegram account must call
+    ``invalidate_user``, which starts a new generation of the user: entries
+    stamped with an older one are ignored by every worker sharing the
+    cache. Loaders take the ``generation`` before reading the account and
+    pass it to ``set``, so an invalidation landing in between leaves the
+    entry already stale. Without a ``cache`` the principals are kept in an
+    LRU of ``max_size`` entries in this process.
+
+    Session strings grant full access to the Telegram account, so they are
+    only kept in this process. Shared entries just say whether the account
+    is authorized, and a worker that did not load the session string itself
+    treats them as a miss.
+    """
+
+    def __init__(self, cache: Cache = None, max_size: int = 10000, ttl: float = 60):
+        self.cache = cache or Cache(MemoryBackend(max_size), "principal")
+        self.sessions = MemoryBackend(max_size)
+        self.ttl = ttl
+
+    async def get(self, token: str) -> Union[Principal, None]:
+        entry = await self.cache.get(self._key(token))
+        principal = entry and await self._principal(entry)
+        if principal is None:
+            CACHE_LOOKUPS.labels("principal", "miss").inc()
+            return None
+        CACHE_LOOKUPS.labels("principal", "hit").inc()
+        return principal
+
+    async def _principal(self, entry: dict) -> Union[Principal, None]:
+        generation = await self.cache.generation(entry["user_id"])
+        if entry["generation"] != generation:
+            return None
+        account = entry["telegram_account"]
+        if account:
+            session_string = await self.sessions.get(f"{entry['user_id']}:{generation}")
+            if session_string is None:
+                return None
+            account = TelegramAccountState(session_string, account["is_telegram_auth"])
+        return Principal(id=entry["user_id"], email=entry["email"], telegram_account=account)
+
+    async def generation(self, user_id: int) -> str:
+        return await self.cache.generation(user_id)
+
+    async def set(self, token: str, principal: Principal, token_expires_at: float, generation: str):
+        ttl = min(self.ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        account = principal.telegram_account
+        if account:
+            await self.sessions.set(f"{principal.id}:{generation}", account.session_string, ttl)
+        await self.cache.set(self._key(token), {
+            "user_id": principal.id,
+            "email": principal.email,
+            "telegram_account": {"is_telegram_auth": account.is_telegram_auth} if account else None,
+            "generation": generation,
+        }, ttl)
+
+    async def invalidate_user(self, user_id: int):
+        await self.cache.invalidate(user_id)
+
+    async def close(self):
+        await self.cache.close()
+        await self.sessions.close()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Bearer tokens are not written to shared storage as they are
+        return hashlib.sha256(token.encode()).hexdigest()
+
+
+principal_cache = PrincipalCache(
+    Cache(create_backend(config.CACHE_URL, max_size=config.PRINCIPAL_CACHE_SIZE), "principal"),
+    ttl=config.PRINCIPAL_CACHE_TTL,
+)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import HTTPException
+from app.core import config
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it.
+
+        The balance may go negative, so callers queue up in arrival order.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class TelegramScheduler:
+    """Gate for outbound Telegram operations.
+
+    Every operation takes a token from a global bucket and from the bucket
+    of its account. A FloodWaitError blocks the account for the requested
+    time: operations queue behind the block and are retried after it, as
+    long as the wait is at most ``max_flood_wait`` seconds. Longer waits are
+    surfaced as HTTP 429 with a Retry-After header.
+    """
+
+    def __init__(self, global_rate: float = 30, global_burst: float = 60, account_rate: float = 5,
+                 account_burst: float = 10, max_flood_wait: float = 30, max_retries: int = 2,
+                 max_accounts: int = 10000):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.max_flood_wait = max_flood_wait
+        self.max_retries = max_retries
+        self.max_accounts = max_accounts
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._accounts: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._blocked_until: dict = {}
+
+    async def call(self, key: Hashable, fn: Callable[[], Awaitable]):
+        from telethon.errors import FloodWaitError
+
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(key)
+            try:
+                return await fn()
+            except FloodWaitError as e:
+                blocked_until = time.monotonic() + e.seconds
+                self._blocked_until[key] = max(self._blocked_until.get(key, 0), blocked_until)
+                if e.seconds > self.max_flood_wait or attempt == self.max_retries:
+                    raise self._flood_error(e.seconds)
+
+    async def acquire(self, key: Hashable):
+        blocked = self._blocked_until.get(key, 0) - time.monotonic()
+        if blocked > self.max_flood_wait:
+            raise self._flood_error(blocked)
+        if blocked > 0:
+            await asyncio.sleep(blocked)
+        else:
+            self._blocked_until.pop(key, None)
+
+        delay = max(self._bucket(key).reserve(), self._global.reserve())
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._accounts.get(key)
+        if bucket is None:
+            bucket = self._accounts[key] = TokenBucket(self.account_rate, self.account_burst)
+            if len(self._accounts) > self.max_accounts:
+                self._accounts.popitem(last=False)
+        self._accounts.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _flood_error(seconds: float) -> HTTPException:
+        retry_after = max(int(seconds + 0.999), 1)
+        return HTTPException(
+            status_code=429,
+            detail=f"Telegram rate limit, retry in {retry_after} seconds",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+telegram_scheduler = TelegramScheduler(
+    global_rate=config.TELEGRAM_GLOBAL_RATE,
+    global_burst=config.TELEGRAM_GLOBAL_BURST,
+    account_rate=config.TELEGRAM_ACCOUNT_RATE,
+    account_burst=config.TELEGRAM_ACCOUNT_BURST,
+    max_flood_wait=config.TELEGRAM_MAX_FLOOD_WAIT,
+    max_retries=config.TELEGRAM_FLOOD_RETRIES,
+)
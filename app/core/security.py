@@ -1,11 +1,95 @@
-from passlib.context import CryptContext
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from fastapi import HTTPException
+
+from app.core import config
+from app.core.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASHES_IN_PROGRESS, timed
+
+
+@functools.cache
+def pwd_context():
+    """The passlib context, built on first use.
+
+    Hashing runs in the worker processes of PasswordHasher, so the API
+    process itself never needs passlib and its bcrypt backend. Hashes made
+    with other rounds are reported by verify_and_update, so changing
+    BCRYPT_ROUNDS rehashes passwords on the next successful login.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str]:
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded pool of worker processes.
+
+    bcrypt is CPU bound and holds the GIL, so running it in processes keeps
+    the event loop responsive and uses every core. When ``max_pending``
+    hashes are already queued or running, new ones are refused with a 503
+    instead of piling up.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = 64):
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._executor = None
+        self._pending = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str]:
+        """Check a password; also return a new hash if its rounds are outdated."""
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, try again later",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            # Not forked: the parent runs event loop and database threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        self._pending += 1
+        try:
+            with timed(PASSWORD_HASH_DURATION, PASSWORD_HASHES_IN_PROGRESS, operation=fn.__name__):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self.close()
+            raise HTTPException(status_code=503, detail="Password hashing unavailable, try again later",
+                                headers={"Retry-After": "1"})
+        finally:
+            self._pending -= 1
+
+
+password_hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import stat
+import struct
+import time
+
+import orjson
+from fastapi import HTTPException
+
+from app.core import config
+
+# Frames are a kind byte and a length, followed by JSON or raw bytes
+FRAME = struct.Struct(">BI")
+JSON_FRAME, BYTES_FRAME = 0, 1
+
+
+async def write_frame(writer: asyncio.StreamWriter, value):
+    if isinstance(value, bytes):
+        kind, payload = BYTES_FRAME, value
+    else:
+        kind, payload = JSON_FRAME, orjson.dumps(value)
+    writer.write(FRAME.pack(kind, len(payload)) + payload)
+    await writer.drain()
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    kind, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    payload = await reader.readexactly(length)
+    return payload if kind == BYTES_FRAME else orjson.loads(payload)
+
+
+def peer_is_trusted(writer: asyncio.StreamWriter) -> bool:
+    """Whether the process at the other end of a Unix socket runs as this user.
+
+    Platforms without SO_PEERCRED rely on the private socket directory alone.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    credentials = writer.get_extra_info("socket").getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+
+def _hash(value: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto named nodes.
+
+    Each node is placed ``replicas`` times on the ring, so keys spread
+    evenly and adding or removing a node only moves the keys it gains or
+    loses.
+    """
+
+    def __init__(self, nodes, replicas: int = 100):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key):
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._nodes)
+        return self._nodes[index]
+
+
+class ShardRouter:
+    """Account affinity between the worker processes of one host.
+
+    Every worker listens on a Unix socket in ``directory``, and the sockets
+    present there form the hash ring that assigns each account to one
+    owner. Sockets left behind by dead workers are removed the first time a
+    connection to them is refused, which moves their accounts on. Without a
+    directory every worker owns every account.
+
+    The directory is listed at most once per ``members_ttl`` seconds, and
+    again right after a socket was removed, so workers that joined are
+    picked up within that delay.
+
+    Forwarded calls carry session strings and login codes, so the directory
+    must be private to the user running the workers, and both ends check
+    that their peer runs as that user.
+    """
+
+    def __init__(self, directory: str, timeout: float = 60, replicas: int = 100, name: str = None,
+                 members_ttl: float = 2):
+        self.directory = directory
+        self.timeout = timeout
+        self.replicas = replicas
+        self.name = name
+        self.members_ttl = members_ttl
+
+        self._members = None
+        self._listed_at = None
+        self._ring = HashRing([])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @property
+    def path(self) -> str:
+        # Resolved late: workers may be forked after this module is imported
+        return os.path.join(self.directory, self.name or f"worker-{os.getpid()}.sock")
+
+    def owner(self, user_id: int) -> str:
+        """Socket path of the worker owning ``user_id``."""
+        now = time.monotonic()
+        if self._listed_at is None or now - self._listed_at >= self.members_ttl:
+            self._listed_at = now
+            members = frozenset(name for name in os.listdir(self.directory) if name.endswith(".sock"))
+            if members != self._members:
+                self._members = members
+                self._ring = HashRing(members, self.replicas)
+        name = self._ring.node(user_id)
+        return os.path.join(self.directory, name) if name else self.path
+
+    def owns(self, user_id: int) -> bool:
+        return not self.enabled or self.owner(user_id) == self.path
+
+    async def connect(self, user_id: int):
+        """Open a connection to the owner of ``user_id``, or None when it is this worker."""
+        while True:
+            path = self.owner(user_id)
+            if path == self.path:
+                return None
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                self.remove(path)
+                continue
+            if not peer_is_trusted(writer):
+                writer.close()
+                raise HTTPException(status_code=502, detail="Telegram worker socket belongs to another user")
+            return reader, writer
+
+    def secure_directory(self):
+        """Create the socket directory private to this user, or refuse an unsafe one."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        info = os.stat(self.directory)
+        if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise RuntimeError(
+                f"TELEGRAM_SHARD_DIR {self.directory} must be owned by this user and not writable by others")
+
+    def refresh(self):
+        """List the directory again on the next lookup."""
+        self._listed_at = None
+
+    def remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self.refresh()
+
+
+shard_router = ShardRouter(
+    directory=config.TELEGRAM_SHARD_DIR,
+    timeout=config.TELEGRAM_SHARD_TIMEOUT,
+    members_ttl=config.TELEGRAM_SHARD_MEMBERS_TTL,
+)
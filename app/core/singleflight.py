@@ -0,0 +1,37 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one in-flight coroutine.
+
+    Callers asking for a key that is already being computed wait for that
+    computation and get its result (or exception) instead of starting their
+    own. A caller that goes away does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.labels("started").inc()
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            SINGLEFLIGHT_CALLS.labels("joined").inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller went away
+            task.exception()
+
+
+telegram_flights = SingleFlight()
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException
+
+from app.core import config
+from app.core.metrics import TELEGRAM_CONNECT_DURATION, TELEGRAM_POOL_CLIENTS, timed
+from app.core.telegram_session import TelegramSessionStore, session_store
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+    from app.core.database_session import DatabaseSession
+
+
+class PooledClient:
+    def __init__(self, client: "TelegramClient"):
+        self.client = client
+        # Telethon drops its reference to the session on log_out
+        self.session = client.session
+        self.lock = asyncio.Lock()
+        self.in_use = 0
+        self.retired = False
+        self.last_used = time.monotonic()
+
+
+class TelegramClientPool:
+    """Process-wide pool of connected Telethon clients keyed by account.
+
+    Borrowing a client reuses the open MTProto connection of the account
+    instead of doing a new handshake per request. Idle clients are evicted
+    after ``idle_ttl`` seconds, and the least recently used idle client makes
+    room when ``max_clients`` is reached.
+
+    With a ``session_store``, clients of authorized accounts use a
+    DatabaseSession, so entities and update state survive reconnects and
+    restarts instead of being relearned from an empty StringSession.
+    """
+
+    def __init__(self, api_id: int, api_hash: str, max_clients: int = 100, idle_ttl: float = 300,
+                 health_check_interval: float = 60, acquire_timeout: float = 10,
+                 flood_sleep_threshold: int = 0, session_store: TelegramSessionStore = None):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.session_store = session_store
+
+        self._clients: "OrderedDict[object, PooledClient]" = OrderedDict()
+        self._condition = asyncio.Condition()
+        self._reaper = None
+
+    @asynccontextmanager
+    async def client(self, key, session_string: str = None):
+        """Borrow a connected client for ``key``.
+
+        Without ``session_string`` a client with a fresh session replaces the
+        pooled one, which is what the authorization flow starts from.
+        """
+        entry = await self._acquire(key, session_string)
+        try:
+            async with entry.lock:
+                if not entry.client.is_connected():
+                    await self._connect(entry)
+            yield entry.client
+        except (ConnectionError, OSError):
+            entry.retired = True
+            raise
+        finally:
+            await self._release(key, entry)
+
+    async def discard(self, key):
+        """Drop the pooled client of ``key``, e.g. after logout."""
+        async with self._condition:
+            entry = self._clients.pop(key, None)
+            if entry:
+                entry.retired = True
+        if entry and not entry.in_use:
+            await self._disconnect(entry)
+
+    async def start(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+        entries = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(self._disconnect(entry) for entry in entries))
+        # Synchronization primitives are bound to the loop that used them
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self, key, session_string: str = None) -> PooledClient:
+        await self.start()
+        session = await self._load_session(key, session_string)
+        evicted = []
+        try:
+            async with self._condition:
+                entry = self._clients.get(key)
+                if entry and (session_string is None or self._session_of(entry) != session_string):
+                    self._clients.pop(key)
+                    entry.retired = True
+                    if not entry.in_use:
+                        evicted.append(entry)
+                    entry = None
+
+                if entry is None:
+                    while len(self._clients) >= self.max_clients:
+                        idle = next((k for k, e in self._clients.items() if not e.in_use), None)
+                        if idle is not None:
+                            evicted.append(self._clients.pop(idle))
+                            continue
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), self.acquire_timeout)
+                        except asyncio.TimeoutError:
+                            raise HTTPException(
+                                status_code=503, detail="Too many active Telegram connections")
+
+                    entry = PooledClient(self._new_client(session_string, session))
+                    self._clients[key] = entry
+
+                self._clients.move_to_end(key)
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                return entry
+        finally:
+            for old in evicted:
+                await self._disconnect(old)
+
+    async def _release(self, key, entry: PooledClient):
+        async with self._condition:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired and self._clients.get(key) is entry:
+                self._clients.pop(key)
+            self._condition.notify_all()
+        if entry.retired and not entry.in_use:
+            await self._disconnect(entry)
+        elif not entry.in_use:
+            await self._flush(entry)
+
+    async def _load_session(self, key, session_string: str = None):
+        entry = self._clients.get(key)
+        if not self.session_store or not session_string or (entry and self._session_of(entry) == session_string):
+            return None
+        # Loaded outside the lock; unused if another borrow creates the client first
+        return await self.session_store.load(key, session_string)
+
+    def _new_client(self, session_string: str = None, session: "DatabaseSession" = None) -> "TelegramClient":
+        # Imported on first use: Telethon is a large share of worker start-up
+        from telethon import TelegramClient
+        from telethon.sessions import StringSession
+
+        if session is None:
+            session = StringSession(session_string) if session_string else StringSession()
+        return TelegramClient(
+            session,
+            self.api_id,
+            self.api_hash,
+            flood_sleep_threshold=self.flood_sleep_threshold
+        )
+
+    async def _connect(self, entry: PooledClient):
+        try:
+            with timed(TELEGRAM_CONNECT_DURATION):
+                await entry.client.connect()
+        except Exception as e:
+            entry.retired = True
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @staticmethod
+    def _session_of(entry: PooledClient) -> str:
+        return entry.session.save()
+
+    async def _disconnect(self, entry: PooledClient):
+        try:
+            await entry.client.disconnect()
+        except Exception:
+            pass
+        # Telethon hands over its final entities and update state on disconnect
+        await self._flush(entry, force=True)
+
+    async def _flush(self, entry: PooledClient, force: bool = False):
+        from app.core.database_session import DatabaseSession
+
+        if not self.session_store or not isinstance(entry.session, DatabaseSession):
+            return
+        try:
+            await self.session_store.flush(entry.session, force=force)
+        except Exception as e:
+            # Unsaved changes stay dirty and go out with the next flush
+            print("====== Error saving Telegram session ======", e)
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(min(self.idle_ttl, self.health_check_interval))
+            await self._reap()
+
+    async def _reap(self):
+        now = time.monotonic()
+        evicted = []
+        async with self._condition:
+            for key, entry in list(self._clients.items()):
+                if entry.in_use:
+                    continue
+                # Idle for too long, or the connection died and nobody is
+                # waiting on it: a later borrow reconnects from scratch.
+                if now - entry.last_used > self.idle_ttl or not entry.client.is_connected():
+                    evicted.append(self._clients.pop(key))
+            if evicted:
+                self._condition.notify_all()
+        for entry in evicted:
+            await self._disconnect(entry)
+
+
+client_pool = TelegramClientPool(
+    api_id=config.TELEGRAM_API_ID,
+    api_hash=config.TELEGRAM_API_HASH,
+    max_clients=config.TELEGRAM_POOL_MAX_CLIENTS,
+    idle_ttl=config.TELEGRAM_POOL_IDLE_TTL,
+    health_check_interval=config.TELEGRAM_POOL_HEALTH_CHECK_INTERVAL,
+    acquire_timeout=config.TELEGRAM_POOL_ACQUIRE_TIMEOUT,
+    flood_sleep_threshold=config.TELEGRAM_FLOOD_SLEEP_THRESHOLD,
+    session_store=session_store,
+)
+
+TELEGRAM_POOL_CLIENTS.labels("in_use").set_function(
+    lambda: sum(1 for entry in client_pool._clients.values() if entry.in_use))
+TELEGRAM_POOL_CLIENTS.labels("idle").set_function(
+    lambda: sum(1 for entry in client_pool._clients.values() if not entry.in_use))
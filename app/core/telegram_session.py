@@ -0,0 +1,64 @@
+import time
+from typing import TYPE_CHECKING
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core import config
+from app.db import SessionLocal
+from app.repositories.session import TelegramSessionRepository
+
+if TYPE_CHECKING:
+    from app.core.database_session import DatabaseSession
+
+
+class TelegramSessionStore:
+    """Loads and flushes DatabaseSessions, each in a database session of its own.
+
+    Flushing is batched: a borrow that ends flushes only when
+    ``flush_interval`` seconds passed since the previous flush, while
+    disconnecting always flushes.
+    """
+
+    def __init__(self, sessions: async_sessionmaker = SessionLocal, flush_interval: float = 5):
+        self.sessions = sessions
+        self.flush_interval = flush_interval
+
+    async def load(self, user_id: int, session_string: str) -> "DatabaseSession":
+        # Telethon is only imported once a client is about to be created
+        from app.core.database_session import DatabaseSession
+
+        session = DatabaseSession(user_id, session_string)
+        if not session.auth_key_id:
+            return session
+
+        async with self.sessions() as db:
+            entities, update_states = await TelegramSessionRepository(db).get_session_data(
+                user_id, session.auth_key_id)
+        return DatabaseSession(user_id, session_string, entities, update_states)
+
+    async def flush(self, session: "DatabaseSession", force: bool = False):
+        if not session.dirty:
+            return
+        if not force and time.monotonic() - session.flushed_at < self.flush_interval:
+            return
+
+        async with self.sessions() as db:
+            session_repo = TelegramSessionRepository(db)
+            if session.deleted:
+                await session_repo.delete_session_data(session.user_id)
+                return
+            if not session.auth_key_id:
+                return
+
+            entities, states = session.take_changes()
+            try:
+                await session_repo.save_session_data(
+                    session.user_id, session.auth_key_id, entities, states)
+            except Exception:
+                session.restore_changes(entities, states)
+                raise
+
+
+session_store = TelegramSessionStore(
+    flush_interval=config.TELEGRAM_SESSION_FLUSH_INTERVAL,
+)
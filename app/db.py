@@ -1,9 +1,54 @@
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import DeclarativeMeta
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-DATABASE_URL = "sqlite:///./data.db"
+from app.core import config
+from app.core.metrics import instrument_engine
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = config.DATABASE_URL
+
+# The repositories upsert with INSERT ... ON CONFLICT, which SQLAlchemy
+# only builds per dialect
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _engine_options(url: str) -> dict:
+    url = make_url(url)
+    # An in-memory SQLite database lives in a single connection, so only
+    # real databases get a sized connection pool
+    if url.database in (None, "", ":memory:"):
+        return {}
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        # aiosqlite defaults to opening a new connection per session
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options | {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def check_dialect(engine: AsyncEngine):
+    """Refuse to start on a database the repositories cannot upsert into."""
+    if engine.dialect.name not in _UPSERT_INSERTS:
+        raise RuntimeError(
+            f"Unsupported database {engine.dialect.name!r}: DATABASE_URL must point to PostgreSQL or SQLite")
+
+
+def upsert_insert(db: AsyncSession):
+    """INSERT construct of the session's database, with on_conflict_do_update."""
+    return _UPSERT_INSERTS[db.get_bind().dialect.name]
+
+
+engine = create_async_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+check_dialect(engine)
+instrument_engine(engine)
+SessionLocal = async_sessionmaker(
+    bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
 Base: DeclarativeMeta = declarative_base()
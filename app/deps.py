@@ -1,43 +1,79 @@
-import os
-import dotenv
+from typing import Union
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.principal_cache import Principal, TelegramAccountState, principal_cache
+from app.core.sharding import shard_router
+from app.core.telegram_pool import client_pool
 from app.services.telegram import TelegramAuthService
+from app.services.telegram_shard import ShardedTelegramService, ShardedUpdateHub
+from app.services.telegram_updates import update_hub
 from app.db import SessionLocal
 from app.models.user import User
+from app.repositories.telegram import TelegramAccountRepository
 from app.core.jwt import verify_access_token
 
-dotenv.load_dotenv()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_principal(token: str, db: AsyncSession) -> Union[Principal, None]:
+    principal = await principal_cache.get(token)
+    if principal:
+        return principal
+
     payload = verify_access_token(token)
     if not payload:
-        raise credentials_exception
+        return None
     email: str = payload.get("sub")
     if email is None:
-        raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
+        return None
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    if user is None:
+        return None
+
+    # Taken before the account is read: a change committed after this point
+    # invalidates the entry written below
+    generation = await principal_cache.generation(user.id)
+    account = await TelegramAccountRepository(db).get_telegram_account(user.id)
+    principal = Principal(
+        id=user.id,
+        email=user.email,
+        telegram_account=TelegramAccountState(
+            session_string=account.session_string,
+            is_telegram_auth=bool(account.is_telegram_auth),
+        ) if account else None,
+    )
+    await principal_cache.set(token, principal, payload["exp"], generation)
+    return principal
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    user = await get_principal(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
-def get_telegram_service():
-    print("TELEGRAM_API_ID", os.getenv('TELEGRAM_API_ID'))
-    return TelegramAuthService(api_id=os.getenv('TELEGRAM_API_ID'), api_hash=os.getenv('TELEGRAM_API_HASH'))
+def get_telegram_service(db: AsyncSession = Depends(get_db)):
+    service = TelegramAuthService(client_pool, db)
+    if shard_router.enabled:
+        return ShardedTelegramService(service, shard_router)
+    return service
+
+
+def get_update_hub():
+    if shard_router.enabled:
+        return ShardedUpdateHub(update_hub, shard_router)
+    return update_hub
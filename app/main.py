@@ -1,12 +1,45 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from app.db import engine
+from app.migrations import migrate
+from app.api import auth, metrics, telegram
+from app.core import config
+from app.core.dialog_cache import dialog_cache
+from app.core.metrics import MetricsMiddleware
+from app.core.principal_cache import principal_cache
+from app.core.security import password_hasher
+from app.core.telegram_pool import client_pool
+from app.services.telegram_shard import shard_server
+from app.services.telegram_sync import sync_worker
+from app.services.telegram_updates import update_hub
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.SCHEMA_AUTO_CREATE:
+        await migrate(engine)
+    await client_pool.start()
+    await shard_server.start()
+    await sync_worker.start()
+    yield
+    await sync_worker.close()
+    await shard_server.close()
+    await update_hub.close()
+    await dialog_cache.close()
+    await principal_cache.close()
+    await client_pool.close()
+    password_hasher.close()
+    await engine.dispose()
 
-from app.db import Base, engine
-from app.api import auth, telegram
 
-Base.metadata.create_all(bind=engine)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI()
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MINIMUM_SIZE)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,9 +49,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(telegram.router, prefix="/telegram", tags=["Telegram"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""Schema management: missing tables plus migrations of existing ones.
+
+    python -m app.migrations
+
+applies them once, e.g. at deploy time with SCHEMA_AUTO_CREATE off, so
+that starting workers do not each inspect the schema.
+"""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.db import Base
+
+# Schema changes that create_all cannot make to existing tables, applied
+# once per database in this order. Statements must be safe to run twice,
+# since workers starting together may both apply a migration
+MIGRATIONS = [
+    ("0001_unique_telegram_account_user", [
+        # Keep the newest account of users that ended up with several
+        "DELETE FROM telegram_accounts WHERE id NOT IN "
+        "(SELECT MAX(id) FROM telegram_accounts GROUP BY user_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_telegram_accounts_user_id ON telegram_accounts (user_id)",
+    ]),
+]
+
+
+async def run_migrations(conn: AsyncConnection):
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(version VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+    applied = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+
+    for version, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version) VALUES (:version) ON CONFLICT DO NOTHING"),
+            {"version": version})
+
+
+async def migrate(engine: AsyncEngine):
+    """Create missing tables and apply pending migrations."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+
+
+async def main():
+    # Importing the app registers every model on Base.metadata
+    import app.main  # noqa: F401
+    from app.db import engine
+
+    await migrate(engine)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,6 +6,6 @@ class TelegramAccount(Base):
     __tablename__ = "telegram_accounts"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
     session_string = Column(String, nullable=False)
     is_telegram_auth = Column(Boolean, default=False)
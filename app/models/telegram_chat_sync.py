@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from app.db import Base
+
+
+class TelegramChatSync(Base):
+    """Range of a chat's history that is fully mirrored in telegram_messages.
+
+    Every message with ``min_message_id <= id <= max_message_id`` is stored
+    locally. ``min_message_id`` is 0 once the start of the chat was reached.
+    """
+    __tablename__ = "telegram_chat_syncs"
+    __table_args__ = (
+        UniqueConstraint("user_id", "chat_id",
+                         name="uq_telegram_chat_syncs_chat"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    min_message_id = Column(Integer, nullable=False)
+    max_message_id = Column(Integer, nullable=False)
+    synced_at = Column(DateTime, nullable=False)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, UniqueConstraint
+from app.db import Base
+
+
+class TelegramEntity(Base):
+    """Display data of a Telegram user, chat or channel as seen by one account."""
+    __tablename__ = "telegram_entities"
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity_id",
+                         name="uq_telegram_entities_entity"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entity_id = Column(BigInteger, nullable=False)
+    name = Column(String, nullable=False)
+    username = Column(String)
+    type = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,65 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, event
+from app.db import Base
+
+
+class TelegramMessage(Base):
+    __tablename__ = "telegram_messages"
+    __table_args__ = (
+        UniqueConstraint("user_id", "chat_id", "message_id",
+                         name="uq_telegram_messages_chat_message"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False, default='')
+    date = Column(DateTime, nullable=False)
+    sender_id = Column(BigInteger)
+    sender = Column(String)
+    media = Column(Boolean, default=False)
+
+
+SEARCH_INDEX = "telegram_messages_fts"
+
+
+def _search_scope(row: str) -> str:
+    # Account and chat become tokens of their own FTS column, so filtering by
+    # them is a posting-list intersection instead of a scan of every match.
+    return f"'u' || {row}.user_id || ' c' || replace({row}.chat_id, '-', 'n')"
+
+
+_SEARCH_INDEX_DDL = [
+    f"""CREATE VIEW telegram_messages_search AS
+        SELECT id, text, {_search_scope('telegram_messages')} AS scope FROM telegram_messages""",
+    f"""CREATE VIRTUAL TABLE {SEARCH_INDEX} USING fts5(
+        text, scope, content='telegram_messages_search', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}, rank) VALUES('rank', 'bm25(1.0, 0.0)')",
+    f"""CREATE TRIGGER telegram_messages_fts_insert AFTER INSERT ON telegram_messages BEGIN
+        INSERT INTO {SEARCH_INDEX}(rowid, text, scope) VALUES (new.id, new.text, {_search_scope('new')});
+    END""",
+    f"""CREATE TRIGGER telegram_messages_fts_delete AFTER DELETE ON telegram_messages BEGIN
+        INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}, rowid, text, scope)
+        VALUES ('delete', old.id, old.text, {_search_scope('old')});
+    END""",
+    f"""CREATE TRIGGER telegram_messages_fts_update AFTER UPDATE OF text ON telegram_messages BEGIN
+        INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}, rowid, text, scope)
+        VALUES ('delete', old.id, old.text, {_search_scope('old')});
+        INSERT INTO {SEARCH_INDEX}(rowid, text, scope) VALUES (new.id, new.text, {_search_scope('new')});
+    END""",
+    f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}) VALUES('rebuild')",
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """Create the SQLite FTS5 index over message text, kept current by triggers."""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        f"SELECT 1 FROM sqlite_master WHERE name = '{SEARCH_INDEX}'").first()
+    if exists:
+        return
+    for statement in _SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
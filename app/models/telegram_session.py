@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, UniqueConstraint
+from app.db import Base
+
+
+class TelegramSessionEntity(Base):
+    """Input entity (id and access hash) learned by an account's Telethon session.
+
+    Rows belong to the authorization key they were learned with, since
+    access hashes are only valid for the session that received them.
+    """
+    __tablename__ = "telegram_session_entities"
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity_id",
+                         name="uq_telegram_session_entities_entity"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    auth_key_id = Column(String, nullable=False)
+    entity_id = Column(BigInteger, nullable=False)
+    hash = Column(BigInteger, nullable=False)
+    username = Column(String)
+    phone = Column(String)
+    name = Column(String)
+
+
+class TelegramUpdateState(Base):
+    """Update state of an account's Telethon session.
+
+    ``entity_id`` 0 holds the common pts/qts/seq; other rows hold the pts
+    of a channel.
+    """
+    __tablename__ = "telegram_update_states"
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity_id",
+                         name="uq_telegram_update_states_entity"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    auth_key_id = Column(String, nullable=False)
+    entity_id = Column(BigInteger, nullable=False)
+    pts = Column(Integer, nullable=False)
+    qts = Column(Integer, nullable=False)
+    date = Column(DateTime, nullable=False)
+    seq = Column(Integer, nullable=False)
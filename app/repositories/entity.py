@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, UTC
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db import upsert_insert
+from app.models.telegram_entity import TelegramEntity
+
+
+class TelegramEntityRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_entities(self, user_id: int, entity_ids, max_age: float) -> dict[int, TelegramEntity]:
+        """Cached entities among ``entity_ids`` updated within ``max_age`` seconds."""
+        try:
+            updated_after = datetime.now(UTC).replace(tzinfo=None) - timedelta(seconds=max_age)
+            query = select(TelegramEntity).where(
+                TelegramEntity.user_id == user_id,
+                TelegramEntity.entity_id.in_(list(entity_ids)),
+                TelegramEntity.updated_at > updated_after)
+            result = await self.db.execute(query)
+            return {row.entity_id: row for row in result.scalars()}
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def save_entities(self, user_id: int, entities: dict[int, dict]):
+        """Insert or refresh entities given as id -> name, username and type.
+
+        One upsert, so concurrent reads resolving the same sender, e.g. the
+        chats of a batch, do not collide on its row.
+        """
+        try:
+            now = datetime.now(UTC).replace(tzinfo=None)
+            statement = upsert_insert(self.db)(TelegramEntity).values([
+                {
+                    'user_id': user_id,
+                    'entity_id': entity_id,
+                    'name': entity['name'],
+                    'username': entity['username'],
+                    'type': entity['type'],
+                    'updated_at': now,
+                }
+                for entity_id, entity in entities.items()
+            ])
+            await self.db.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'entity_id'],
+                set_={name: statement.excluded[name] for name in ('name', 'username', 'type', 'updated_at')}))
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
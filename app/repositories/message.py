@@ -0,0 +1,186 @@
+import re
+from datetime import datetime, UTC
+
+from fastapi import HTTPException
+from sqlalchemy import column, delete, func, literal_column, table, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db import upsert_insert
+from app.models.telegram_chat_sync import TelegramChatSync
+from app.models.telegram_message import SEARCH_INDEX, TelegramMessage
+
+search_index = table(SEARCH_INDEX, column("rowid"), column("rank"))
+
+# Marked ids of channels and supergroups start at -100 followed by 12 digits
+CHANNEL_ID_LIMIT = -1000000000000
+
+
+class TelegramMessageRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_chat_sync(self, user_id: int, chat_id: int) -> TelegramChatSync:
+        try:
+            query = select(TelegramChatSync).where(
+                TelegramChatSync.user_id == user_id,
+                TelegramChatSync.chat_id == chat_id)
+            result = await self.db.execute(query)
+            return result.scalars().first()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def get_messages(self, user_id: int, chat_id: int, limit: int, before_id: int = None, after_id: int = None) -> list[TelegramMessage]:
+        """Stored messages of a chat, newest first."""
+        try:
+            query = select(TelegramMessage).where(
+                TelegramMessage.user_id == user_id,
+                TelegramMessage.chat_id == chat_id)
+            if before_id:
+                query = query.where(TelegramMessage.message_id < before_id)
+            if after_id:
+                # Take the oldest ones above after_id, like a reverse iter_messages
+                query = query.where(TelegramMessage.message_id > after_id).order_by(
+                    TelegramMessage.message_id.asc())
+                result = await self.db.execute(query.limit(limit))
+                return list(reversed(result.scalars().all()))
+
+            query = query.order_by(TelegramMessage.message_id.desc())
+            result = await self.db.execute(query.limit(limit))
+            return result.scalars().all()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def save_messages(self, user_id: int, chat_id: int, messages: list[dict],
+                      min_message_id: int = None, max_message_id: int = None) -> TelegramChatSync:
+        """Store fetched messages and, when given, the new synced range.
+
+        Both are upserts, so edits seen on a later fetch overwrite the old
+        text, and requests or the sync worker storing the same chat at once
+        do not trip over each other's rows.
+        """
+        try:
+            if messages:
+                insert = upsert_insert(self.db)
+                statement = insert(TelegramMessage).values([
+                    {
+                        'user_id': user_id,
+                        'chat_id': chat_id,
+                        'message_id': msg['id'],
+                        'text': msg['text'],
+                        'date': datetime.fromisoformat(msg['date']).astimezone(UTC).replace(tzinfo=None),
+                        'sender_id': msg['sender_id'],
+                        'sender': msg['sender'],
+                        'media': msg['media'],
+                    }
+                    for msg in messages
+                ])
+                await self.db.execute(statement.on_conflict_do_update(
+                    index_elements=['user_id', 'chat_id', 'message_id'],
+                    set_={name: statement.excluded[name] for name in ('text', 'date', 'sender_id', 'sender', 'media')}))
+
+            sync = None
+            if min_message_id is not None and max_message_id is not None:
+                values = {
+                    'min_message_id': min_message_id,
+                    'max_message_id': max_message_id,
+                    'synced_at': datetime.now(UTC).replace(tzinfo=None),
+                }
+                statement = upsert_insert(self.db)(TelegramChatSync).values(
+                    user_id=user_id, chat_id=chat_id, **values).on_conflict_do_update(
+                    index_elements=['user_id', 'chat_id'], set_=values).returning(TelegramChatSync)
+                sync = await self.db.scalar(statement, execution_options={"populate_existing": True})
+
+            await self.db.commit()
+            return sync
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def update_message(self, user_id: int, chat_id: int, message: dict):
+        """Apply an edit to a stored message; messages not stored are left alone."""
+        try:
+            await self.db.execute(update(TelegramMessage).where(
+                TelegramMessage.user_id == user_id,
+                TelegramMessage.chat_id == chat_id,
+                TelegramMessage.message_id == message['id']).values(
+                text=message['text'], media=message['media']))
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def delete_messages(self, user_id: int, chat_id: int, message_ids: list[int]):
+        """Drop deleted messages from the store.
+
+        Telegram only names the chat of deletions in channels. Without
+        ``chat_id`` the ids are matched in the account's other chats, which
+        share one message id sequence.
+        """
+        try:
+            query = delete(TelegramMessage).where(
+                TelegramMessage.user_id == user_id,
+                TelegramMessage.message_id.in_(message_ids))
+            if chat_id is None:
+                query = query.where(TelegramMessage.chat_id > CHANNEL_ID_LIMIT)
+            else:
+                query = query.where(TelegramMessage.chat_id == chat_id)
+            await self.db.execute(query)
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def search_messages(self, user_id: int, query: str, chat_id: int = None, limit: int = 20) -> list[tuple[TelegramMessage, str, float]]:
+        """Best matches for ``query`` as (message, snippet, rank) tuples.
+
+        Every word of the query must match, the last one as a prefix so that
+        search-as-you-type works.
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+
+        try:
+            if self.db.get_bind().dialect.name != "sqlite":
+                return await self._search_messages_like(user_id, terms, chat_id, limit)
+
+            scope = [f'scope:"u{user_id}"']
+            if chat_id is not None:
+                scope.append(f'scope:"c{str(chat_id).replace("-", "n")}"')
+            words = [f'"{term}"' for term in terms]
+            words[-1] += "*"
+            match = " AND ".join(scope) + f" AND text:({' '.join(words)})"
+
+            snippet = func.snippet(literal_column(SEARCH_INDEX), 0,
+                                   "<mark>", "</mark>", "…", 12)
+            query = select(TelegramMessage, snippet, search_index.c.rank).join(
+                search_index, search_index.c.rowid == TelegramMessage.id).where(
+                literal_column(SEARCH_INDEX).op("MATCH")(match),
+                TelegramMessage.user_id == user_id).order_by(
+                search_index.c.rank).limit(limit)
+            result = await self.db.execute(query)
+            return result.all()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def _search_messages_like(self, user_id: int, terms: list[str], chat_id: int = None, limit: int = 20):
+        # Databases without the FTS5 index get an unranked substring search
+        query = select(TelegramMessage).where(
+            TelegramMessage.user_id == user_id,
+            *(TelegramMessage.text.ilike(f"%{term}%") for term in terms))
+        if chat_id is not None:
+            query = query.where(TelegramMessage.chat_id == chat_id)
+        query = query.order_by(TelegramMessage.date.desc()).limit(limit)
+        result = await self.db.execute(query)
+        return [(row, row.text, None) for row in result.scalars()]
@@ -0,0 +1,104 @@
+from datetime import UTC
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.telegram_session import TelegramSessionEntity, TelegramUpdateState
+
+if TYPE_CHECKING:
+    from telethon.tl.types.updates import State
+
+
+class TelegramSessionRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_session_data(self, user_id: int, auth_key_id: str) -> tuple[list[tuple], dict[int, "State"]]:
+        """Entity rows and update states stored for the account's current key."""
+        from telethon.tl.types.updates import State
+
+        try:
+            result = await self.db.execute(select(TelegramSessionEntity).where(
+                TelegramSessionEntity.user_id == user_id,
+                TelegramSessionEntity.auth_key_id == auth_key_id))
+            entities = [(row.entity_id, row.hash, row.username, row.phone, row.name)
+                        for row in result.scalars()]
+
+            result = await self.db.execute(select(TelegramUpdateState).where(
+                TelegramUpdateState.user_id == user_id,
+                TelegramUpdateState.auth_key_id == auth_key_id))
+            states = {
+                row.entity_id: State(row.pts, row.qts, row.date.replace(tzinfo=UTC), row.seq, unread_count=0)
+                for row in result.scalars()
+            }
+            return entities, states
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def save_session_data(self, user_id: int, auth_key_id: str, entities: dict[int, tuple],
+                                states: dict[int, "State"]):
+        """Write changed entity rows and update states in one transaction.
+
+        Data learned under another authorization key of the account is
+        dropped, as its access hashes no longer work.
+        """
+        try:
+            for model in (TelegramSessionEntity, TelegramUpdateState):
+                await self.db.execute(delete(model).where(
+                    model.user_id == user_id, model.auth_key_id != auth_key_id))
+
+            if entities:
+                result = await self.db.execute(select(TelegramSessionEntity).where(
+                    TelegramSessionEntity.user_id == user_id,
+                    TelegramSessionEntity.entity_id.in_(list(entities))))
+                stored = {row.entity_id: row for row in result.scalars()}
+
+                for entity_id, (_, hash, username, phone, name) in entities.items():
+                    row = stored.get(entity_id)
+                    if row is None:
+                        row = TelegramSessionEntity(user_id=user_id, entity_id=entity_id)
+                        self.db.add(row)
+                    row.auth_key_id = auth_key_id
+                    row.hash = hash
+                    row.username = username
+                    row.phone = phone
+                    row.name = name
+
+            if states:
+                result = await self.db.execute(select(TelegramUpdateState).where(
+                    TelegramUpdateState.user_id == user_id,
+                    TelegramUpdateState.entity_id.in_(list(states))))
+                stored = {row.entity_id: row for row in result.scalars()}
+
+                for entity_id, state in states.items():
+                    row = stored.get(entity_id)
+                    if row is None:
+                        row = TelegramUpdateState(user_id=user_id, entity_id=entity_id)
+                        self.db.add(row)
+                    row.auth_key_id = auth_key_id
+                    row.pts = state.pts
+                    row.qts = state.qts
+                    row.date = state.date.astimezone(UTC).replace(tzinfo=None)
+                    row.seq = state.seq
+
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def delete_session_data(self, user_id: int):
+        try:
+            for model in (TelegramSessionEntity, TelegramUpdateState):
+                await self.db.execute(delete(model).where(model.user_id == user_id))
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
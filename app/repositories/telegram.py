@@ -1,67 +1,76 @@
+from datetime import datetime
+
 from fastapi import HTTPException
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.db import upsert_insert
 from app.models.user import User
 from app.models.telegram_account import TelegramAccount
+from app.models.telegram_chat_sync import TelegramChatSync
 
 
 class TelegramAccountRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
-        try:
-            account = TelegramAccount(
-                session_string=session_string, user_id=user_id, is_telegram_auth=False)
-            self.db.add(account)
-            self.db.commit()
-            self.db.refresh(account)
-            return account
-        except SQLAlchemyError as e:
-            self.db.rollback()
-            raise HTTPException(
-                status_code=500, detail=str(e))
-
-    def get_telegram_account(self, user_id: int) -> TelegramAccount:
+    async def get_telegram_account(self, user_id: int) -> TelegramAccount:
         try:
             query = select(TelegramAccount).where(
                 TelegramAccount.user_id == user_id)
-            result = self.db.execute(query)
+            result = await self.db.execute(query)
             telegram_account = result.scalars().first()
             if not telegram_account:
                 return None
             return telegram_account
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
 
-    def update_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
+    async def upsert_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
+        """Create the account of ``user_id`` or overwrite it, in one statement."""
+        values = {"session_string": session_string, "is_telegram_auth": is_telegram_auth}
         try:
-            account = self.get_telegram_account(user_id)
-
-            account.session_string = session_string
-            account.is_telegram_auth = is_telegram_auth
-
-            self.db.commit()
-            self.db.refresh(account)
+            statement = upsert_insert(self.db)(TelegramAccount).values(user_id=user_id, **values).on_conflict_do_update(
+                index_elements=[TelegramAccount.user_id], set_=values).returning(TelegramAccount)
+            account = await self.db.scalar(statement, execution_options={"populate_existing": True})
+            await self.db.commit()
             return account
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
 
-    def delete_telegram_account(self, user_id: int) -> TelegramAccount:
+    async def delete_telegram_account(self, user_id: int) -> TelegramAccount:
         try:
-            account = self.get_telegram_account(user_id)
+            account = await self.get_telegram_account(user_id)
+            if account is None:
+                # Already gone, e.g. after a concurrent disconnect
+                return None
 
-            self.db.delete(account)
-            self.db.commit()
+            await self.db.delete(account)
+            await self.db.commit()
 
             return account
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def get_recently_synced_accounts(self, since: datetime) -> list[tuple[TelegramAccount, datetime]]:
+        """Authorized accounts with a chat synced after ``since``, with their last sync."""
+        try:
+            last_synced = func.max(TelegramChatSync.synced_at)
+            query = select(TelegramAccount, last_synced).join(
+                TelegramChatSync, TelegramChatSync.user_id == TelegramAccount.user_id).where(
+                TelegramAccount.is_telegram_auth.is_(True)).group_by(
+                TelegramAccount.id).having(last_synced > since)
+            result = await self.db.execute(query)
+            return result.all()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
@@ -10,9 +10,9 @@ class UserRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create_user(self, str, email: str, hashed_password: str) -> User:
+    async def create_user(self, email: str, hashed_password: str) -> User:
         try:
-            if self.db.query(User).filter(User.email == email).first():
+            if await self.get_user_by_email(email):
                 raise HTTPException(
                     status_code=400, detail="Email already registered")
 
@@ -20,36 +20,46 @@ class UserRepository:
                             hashed_password=hashed_password)
 
             self.db.add(new_user)
-            self.db.commit()
-            self.db.refresh(new_user)
+            await self.db.commit()
+            await self.db.refresh(new_user)
             return new_user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
 
-    def get_user(self, user_id: int) -> User:
+    async def get_user(self, user_id: int) -> User:
         try:
             query = select(User).where(User.id == user_id)
-            result = self.db.execute(query)
+            result = await self.db.execute(query)
             user = result.scalars().first()
             if not user:
-                None
+                return None
             return user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
 
-    def get_user_by_email(self, email: str) -> User:
+    async def get_user_by_email(self, email: str) -> User:
         try:
             query = select(User).where(User.email == email)
-            result = self.db.execute(query)
+            result = await self.db.execute(query)
             user = result.scalars().first()
             if not user:
                 return None
             return user
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=500, detail=str(e))
+
+    async def update_password_hash(self, user: User, hashed_password: str) -> User:
+        try:
+            user.hashed_password = hashed_password
+            await self.db.commit()
+            return user
+        except SQLAlchemyError as e:
+            await self.db.rollback()
             raise HTTPException(
                 status_code=500, detail=str(e))
@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from app.core import config
 
 
 class PhoneAuthRequest(BaseModel):
@@ -15,3 +20,53 @@ class PhoneCodeVerifyRequest(BaseModel):
 class TwoFactorAuthRequest(BaseModel):
     password: str
     session_string: str
+
+
+class MessageBatchChat(BaseModel):
+    chat_id: int
+    limit: int = Field(20, ge=1, le=100)
+
+
+class MessageBatchRequest(BaseModel):
+    chats: list[MessageBatchChat] = Field(..., min_length=1, max_length=config.TELEGRAM_BATCH_MAX_CHATS)
+
+
+class TelegramStatus(BaseModel):
+    status: str
+    message: str
+
+
+class LastMessage(BaseModel):
+    id: Optional[int] = None
+    text: Optional[str] = None
+    date: Optional[datetime] = None
+    sender_id: Optional[int] = None
+    sender: Optional[str] = None
+
+
+class Chat(BaseModel):
+    id: int
+    name: str
+    type: str
+    last_message: LastMessage
+
+
+class Message(BaseModel):
+    id: int
+    text: str
+    date: datetime
+    sender_id: Optional[int] = None
+    sender: Optional[str] = None
+    media: bool
+
+
+class MessagePage(BaseModel):
+    messages: list[Message]
+    next_cursor: Optional[str] = None
+    poll_cursor: str
+
+
+class MessageSearchResult(Message):
+    chat_id: int
+    snippet: Optional[str] = None
+    rank: Optional[float] = None
@@ -1,7 +1,7 @@
 from fastapi import HTTPException, status
-from passlib.context import CryptContext
 from app.core.jwt import create_access_token
-from app.core.security import verify_password
+from app.core.principal_cache import principal_cache
+from app.core.security import password_hasher
 from app.models.telegram_account import TelegramAccount
 from app.repositories.telegram import TelegramAccountRepository
 from app.repositories.user import UserRepository
@@ -10,50 +10,56 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.token import Token
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class AuthService:
     def __init__(self, db: AsyncSession):
         self.user_repo = UserRepository(db)
         self.telegram_repo = TelegramAccountRepository(db)
 
-    def get_password_hash(self, password: str) -> str:
-        return pwd_context.hash(password)
-
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+    async def get_password_hash(self, password: str) -> str:
+        return await password_hasher.hash(password)
 
-    def register(self, user: UserCreate) -> Token:
-        hashed_password = self.get_password_hash(user.password)
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        valid, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+        return valid
 
-        if self.user_repo.get_user_by_email(user.email):
+    async def register(self, user: UserCreate) -> Token:
+        if await self.user_repo.get_user_by_email(user.email):
             raise HTTPException(
                 status_code=409, detail="Email already registered")
 
-        user = self.user_repo.create_user(user.email, hashed_password)
+        hashed_password = await self.get_password_hash(user.password)
+        user = await self.user_repo.create_user(user.email, hashed_password)
         access_token = create_access_token(data={"sub": user.email})
         return Token(access_token=access_token)
 
-    def login(self, data: UserLogin) -> Token:
-        user = self.user_repo.get_user_by_email(data.email)
+    async def login(self, data: UserLogin) -> Token:
+        user = await self.user_repo.get_user_by_email(data.email)
+
+        valid, new_hash = False, None
+        if user:
+            valid, new_hash = await password_hasher.verify_and_update(data.password, user.hashed_password)
 
-        if not user or not verify_password(data.password, user.hashed_password):
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials",
             )
+
+        if new_hash:
+            await self.user_repo.update_password_hash(user, new_hash)
         access_token = create_access_token(data={"sub": user.email})
         return Token(access_token=access_token)
 
-    def refresh_user(self, user_id: int):
-        return self.telegram_repo.get_telegram_account(user_id)
-
-    def create_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
-        return self.telegram_repo.create_telegram_account(session_string, user_id, is_telegram_auth)
+    async def refresh_user(self, user_id: int):
+        return await self.telegram_repo.get_telegram_account(user_id)
 
-    def update_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
-        return self.telegram_repo.update_telegram_account(session_string, user_id, is_telegram_auth)
+    async def upsert_telegram_account(self, session_string: str, user_id: int, is_telegram_auth: bool) -> TelegramAccount:
+        account = await self.telegram_repo.upsert_telegram_account(session_string, user_id, is_telegram_auth)
+        await principal_cache.invalidate_user(user_id)
+        return account
 
-    def delete_telegram_account(self, user_id: int) -> TelegramAccount:
-        return self.telegram_repo.delete_telegram_account(user_id)
+    async def delete_telegram_account(self, user_id: int) -> TelegramAccount:
+        account = await self.telegram_repo.delete_telegram_account(user_id)
+        await principal_cache.invalidate_user(user_id)
+        return account
@@ -1,167 +1,581 @@
+import asyncio
+from datetime import datetime, UTC
+
 from fastapi import HTTPException
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.core.cursor import encode_cursor
+from app.core.dialog_cache import DialogCache, dialog_cache
+from app.core.etag import make_etag
+from app.core.media_cache import MediaCache, MediaFile, MediaInfo, MediaStream, media_cache
+from app.core.metrics import CACHE_LOOKUPS, TELEGRAM_CALL_DURATION, TELEGRAM_CALLS_IN_PROGRESS, timed
+from app.core.rate_limit import TelegramScheduler, telegram_scheduler
+from app.core.singleflight import SingleFlight, telegram_flights
+from app.core.telegram_pool import TelegramClientPool
+from app.db import SessionLocal
+from app.repositories.entity import TelegramEntityRepository
+from app.repositories.message import TelegramMessageRepository
+
+# Thumbnail variants by the pixel size of their longer side
+MEDIA_SIZES = {'small': 100, 'medium': 320, 'large': 800}
 
 
 class TelegramAuthService:
-    def __init__(self, api_id: int, api_hash: str):
-        self.api_id = api_id
-        self.api_hash = api_hash
+    def __init__(self, pool: TelegramClientPool, db: AsyncSession, dialogs: DialogCache = dialog_cache,
+                 flights: SingleFlight = telegram_flights, scheduler: TelegramScheduler = telegram_scheduler,
+                 sessions: async_sessionmaker = SessionLocal, media: MediaCache = media_cache):
+        self.pool = pool
+        self.dialogs = dialogs
+        self.flights = flights
+        self.scheduler = scheduler
+        # Entity lookups also run from background refreshes and concurrent
+        # batch fetches, and coalesced reads outlive the request that started
+        # them, so they use sessions of their own
+        self.sessions = sessions
+        self.media = media
+        self.message_repo = TelegramMessageRepository(db)
 
-        self.phone_number = None
-        self.phone_code_hash = None
-        self.client = None
+    @staticmethod
+    def _sender_name(sender):
+        if hasattr(sender, 'first_name') or hasattr(sender, 'last_name'):
+            full_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
+            return full_name or sender.username or "Unknown"
+        if hasattr(sender, 'title'):
+            return sender.title
+        return getattr(sender, 'username', None) or "Unknown"
 
-    async def create_client(self, session_string: str = None):
-        try:
-            self.client = TelegramClient(
-                StringSession(
-                    session_string) if session_string else StringSession(),
-                self.api_id,
-                self.api_hash
-            )
-            await self.client.connect()
-            return self.client
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    @classmethod
+    def serialize_message(cls, message, sender_name: str = None) -> dict:
+        if sender_name is None and message.sender:
+            sender_name = cls._sender_name(message.sender)
 
-    async def start_authorization(self, phone_number: str):
-        try:
-            await self.create_client()
+        return {
+            'id': message.id,
+            'text': message.text or '',
+            'date': message.date.isoformat(),
+            'sender_id': message.sender_id,
+            'sender': sender_name,
+            'media': bool(message.media)
+        }
+
+    async def _run(self, user_id: int, session_string: str, operation):
+        """Run ``operation(client)`` on the account's pooled client.
+
+        The call goes through the scheduler, so it respects the rate limits
+        and is retried after a short FloodWait. Its duration is recorded
+        under the operation's name, e.g. ``iter_dialogs`` or ``sign_in``.
+        """
+        async def attempt():
+            async with self.pool.client(user_id, session_string) as client:
+                with self._timed(operation.__name__):
+                    return await operation(client)
+
+        return await self.scheduler.call(user_id, attempt)
+
+    @staticmethod
+    def _timed(method: str):
+        return timed(TELEGRAM_CALL_DURATION, TELEGRAM_CALLS_IN_PROGRESS.labels(method), method=method)
+
+    async def _sender_names(self, user_id: int, messages) -> dict[int, str]:
+        """Display names of the senders of ``messages`` by sender id.
+
+        Names come from the account's entity cache while it is younger than
+        ``TELEGRAM_ENTITY_CACHE_TTL``. Other senders are described from the
+        entities Telegram sent along and written back, so each sender is
+        resolved once per TTL window instead of on every read.
+        """
+        sender_ids = {message.sender_id for message in messages if message and message.sender_id}
+        if not sender_ids:
+            return {}
+
+        async with self.sessions() as db:
+            entity_repo = TelegramEntityRepository(db)
+            cached = await entity_repo.get_entities(
+                user_id, sender_ids, config.TELEGRAM_ENTITY_CACHE_TTL)
+            CACHE_LOOKUPS.labels("entity", "hit").inc(len(cached))
+            CACHE_LOOKUPS.labels("entity", "miss").inc(len(sender_ids) - len(cached))
 
-            self.phone_number = phone_number
-            send_code = await self.client.send_code_request(phone_number)
-            self.phone_code_hash = send_code.phone_code_hash
+            resolved = {}
+            for message in messages:
+                if message and message.sender and message.sender_id not in cached:
+                    resolved[message.sender_id] = {
+                        'name': self._sender_name(message.sender),
+                        'username': getattr(message.sender, 'username', None),
+                        'type': message.sender.__class__.__name__,
+                    }
+            if resolved:
+                try:
+                    await entity_repo.save_entities(user_id, resolved)
+                except HTTPException as e:
+                    # Only the cache missed out: the names are still served
+                    print("====== Error caching entities ======", e.detail)
+
+        return {entity_id: entity.name for entity_id, entity in cached.items()} | {
+            entity_id: entity['name'] for entity_id, entity in resolved.items()}
+
+    async def start_authorization(self, user_id: int, phone_number: str):
+        async def send_code(client):
+            send_code = await client.send_code_request(phone_number)
 
             return {
                 "status": "code_sent",
                 "phone_number": phone_number,
                 "phone_code_hash": send_code.phone_code_hash,
-                "session_string": self.client.session.save()
+                "session_string": client.session.save()
             }
+
+        try:
+            return await self._run(user_id, None, send_code)
+        except HTTPException:
+            raise
         except Exception as e:
             print("====== Error in start_authorization ======", e)
             raise HTTPException(status_code=400, detail=str(e))
-        finally:
-            if self.client:
-                await self.client.disconnect()
 
-    async def verify_phone_code(self, phone_number: str, phone_code: str, phone_code_hash: str, session_string: str = None):
-        try:
-            await self.create_client(session_string)
-            await self.client.sign_in(
-                phone_number,
-                phone_code,
-                phone_code_hash=phone_code_hash
-            )
+    async def verify_phone_code(self, user_id: int, phone_number: str, phone_code: str, phone_code_hash: str, session_string: str = None):
+        from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
 
+        async def sign_in(client):
+            try:
+                await client.sign_in(
+                    phone_number,
+                    phone_code,
+                    phone_code_hash=phone_code_hash
+                )
+            except SessionPasswordNeededError:
+                return {
+                    "status": "2fa_required",
+                    "session_string": client.session.save()
+                }
+
+            await self.dialogs.invalidate(user_id)
             return {
                 "status": "success",
-                "session_string": self.client.session.save()
-            }
-        except SessionPasswordNeededError:
-            return {
-                "status": "2fa_required",
-                "session_string": self.client.session.save()
+                "session_string": client.session.save()
             }
+
+        try:
+            return await self._run(user_id, session_string, sign_in)
         except PhoneCodeInvalidError:
             raise HTTPException(
                 status_code=400, detail="Invalid verification code")
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
-        finally:
-            if self.client:
-                await self.client.disconnect()
 
-    async def verify_2fa_password(self, password: str, session_string: str = None):
-        try:
-            await self.create_client(session_string)
-            await self.client.sign_in(password=password)
+    async def verify_2fa_password(self, user_id: int, password: str, session_string: str = None):
+        async def sign_in(client):
+            await client.sign_in(password=password)
+            await self.dialogs.invalidate(user_id)
             return {
                 "status": "success",
-                "session_string": self.client.session.save()
+                "session_string": client.session.save()
             }
+
+        try:
+            return await self._run(user_id, session_string, sign_in)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
-        finally:
-            if self.client:
-                await self.client.disconnect()
 
-    async def get_chats(self, session_string: str):
+    async def get_chats(self, user_id: int, session_string: str):
+        return await self.flights.do(
+            (user_id, "get_chats"),
+            lambda: self.dialogs.get(user_id, lambda: self._fetch_chats(user_id, session_string)))
+
+    async def refresh_chats(self, user_id: int, session_string: str):
+        """Reload the dialog list into the cache ahead of the next read."""
+        return await self.flights.do(
+            (user_id, "get_chats"),
+            lambda: self.dialogs.refresh(user_id, lambda: self._fetch_chats(user_id, session_string)))
+
+    async def _fetch_chats(self, user_id: int, session_string: str):
+        async def iter_dialogs(client):
+            return [dialog async for dialog in client.iter_dialogs()]
+
         try:
-            await self.create_client(session_string)
-            chats = []
-            async for dialog in self.client.iter_dialogs():
-                last_message = dialog.message
-                sender_name = None
-
-                if last_message and last_message.sender:
-                    if hasattr(last_message.sender, 'first_name') or hasattr(last_message.sender, 'last_name'):
-                        sender_name = f"{last_message.sender.first_name or ''} {
-                            last_message.sender.last_name or ''}".strip()
-                    elif hasattr(last_message.sender, 'title'):
-                        sender_name = last_message.sender.title
-                    else:
-                        sender_name = last_message.sender.username or "Unknown"
-
-                chat = {
-                    'id': dialog.id,
-                    'name': dialog.name or 'Unnamed',
-                    'type': dialog.entity.__class__.__name__,
-                    'last_message': {
-                        'id': last_message.id if last_message else None,
-                        'text': last_message.text if last_message and last_message.text else None,
-                        'date': last_message.date if last_message else None,
-                        'sender_id': last_message.sender_id if last_message else None,
-                        'sender': sender_name,
-                    }
+            dialogs = await self._run(user_id, session_string, iter_dialogs)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        sender_names = await self._sender_names(user_id, [dialog.message for dialog in dialogs])
+
+        chats = []
+        for dialog in dialogs:
+            last_message = dialog.message
+
+            chat = {
+                'id': dialog.id,
+                'name': dialog.name or 'Unnamed',
+                'type': dialog.entity.__class__.__name__,
+                'last_message': {
+                    'id': last_message.id if last_message else None,
+                    'text': last_message.text if last_message and last_message.text else None,
+                    'date': last_message.date if last_message else None,
+                    'sender_id': last_message.sender_id if last_message else None,
+                    'sender': sender_names.get(last_message.sender_id) if last_message else None,
                 }
-                chats.append(chat)
-            return chats
+            }
+            chats.append(chat)
+        return chats
+
+    async def get_messages(self, user_id: int, chat_id: int, session_string: str, limit: int = 100,
+                           before_id: int = None, after_id: int = None):
+        """Return one page of chat history, newest first.
+
+        ``before_id`` walks back into older history and ``after_id`` returns
+        only messages newer than the last one a poller has seen.
+
+        Pages come from the local message store. Telegram is only asked for
+        messages above the stored high-water mark, at most once per
+        ``TELEGRAM_MESSAGE_SYNC_INTERVAL``, and for history not stored yet.
+        Edits and deletions are applied to the store by the update hub.
+        """
+        async def load():
+            # Not the caller's request session: the other waiters still need
+            # this one after the caller that started it went away
+            async with self.sessions() as db:
+                return await self._get_messages(
+                    TelegramMessageRepository(db), user_id, chat_id, session_string, limit, before_id, after_id)
+
+        return await self.flights.do(
+            (user_id, "get_messages", chat_id, limit, before_id, after_id), load)
+
+    async def _get_messages(self, message_repo: TelegramMessageRepository, user_id: int, chat_id: int,
+                            session_string: str, limit: int, before_id: int = None, after_id: int = None):
+        sync = await message_repo.get_chat_sync(user_id, chat_id)
+        if sync is None or self._is_stale(sync):
+            sync = await self._sync_newer_messages(message_repo, user_id, chat_id, session_string, sync, limit)
+
+        if after_id:
+            if after_id >= sync.min_message_id:
+                rows = await message_repo.get_messages(
+                    user_id, chat_id, limit, before_id=before_id, after_id=after_id)
+                return self._message_page([self._stored_message(row) for row in rows], limit, before_id, after_id)
+
+            messages = await self._fetch_messages(
+                user_id, session_string, chat_id, limit=limit, min_id=after_id, max_id=before_id or 0, reverse=True)
+            messages.reverse()
+            await message_repo.save_messages(user_id, chat_id, messages)
+            return self._message_page(messages, limit, before_id, after_id)
+
+        if not before_id or before_id > sync.min_message_id:
+            rows = await message_repo.get_messages(
+                user_id, chat_id, limit, before_id=before_id)
+            complete = len(rows) == limit and rows[-1].message_id >= sync.min_message_id
+            if complete or sync.min_message_id == 0:
+                rows = [row for row in rows if row.message_id >= sync.min_message_id]
+                return self._message_page([self._stored_message(row) for row in rows], limit, before_id, after_id)
+
+        messages = await self._fetch_messages(
+            user_id, session_string, chat_id, limit=limit, offset_id=before_id or 0)
+
+        # The page covers every id between its oldest message and before_id,
+        # so it extends the stored range when the two touch.
+        lowest_id = messages[-1]['id'] if len(messages) >= limit else 0
+        if (not before_id or before_id >= sync.min_message_id) and lowest_id <= sync.max_message_id:
+            await message_repo.save_messages(
+                user_id, chat_id, messages,
+                min_message_id=min(lowest_id, sync.min_message_id),
+                max_message_id=max([sync.max_message_id] + [msg['id'] for msg in messages]))
+        else:
+            await message_repo.save_messages(user_id, chat_id, messages)
+
+        return self._message_page(messages, limit, before_id, after_id)
+
+    async def _sync_newer_messages(self, message_repo: TelegramMessageRepository, user_id: int, chat_id: int,
+                                   session_string: str, sync, limit: int):
+        if sync is None:
+            messages = await self._fetch_messages(
+                user_id, session_string, chat_id, limit=limit)
+            min_message_id = messages[-1]['id'] if len(messages) >= limit else 0
+            max_message_id = messages[0]['id'] if messages else 0
+        else:
+            messages = await self._fetch_messages(
+                user_id, session_string, chat_id, limit=config.TELEGRAM_MESSAGE_TOP_UP_LIMIT,
+                min_id=sync.max_message_id)
+            min_message_id = sync.min_message_id
+            max_message_id = messages[0]['id'] if messages else sync.max_message_id
+            if len(messages) >= config.TELEGRAM_MESSAGE_TOP_UP_LIMIT:
+                # Too far behind: keep only the fresh block as the synced range
+                min_message_id = messages[-1]['id']
+
+        return await message_repo.save_messages(
+            user_id, chat_id, messages, min_message_id=min_message_id, max_message_id=max_message_id)
+
+    async def _fetch_messages(self, user_id: int, session_string: str, chat_id: int, **kwargs) -> list[dict]:
+        async def iter_messages(client):
+            return [message async for message in client.iter_messages(chat_id, **kwargs)]
+
+        try:
+            messages = await self._run(user_id, session_string, iter_messages)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
-        finally:
-            if self.client:
-                await self.client.disconnect()
 
-    async def get_messages(self, chat_id: int,  session_string: str,  limit: int = 100):
+        return await self._serialize_messages(user_id, messages)
+
+    async def _serialize_messages(self, user_id: int, messages) -> list[dict]:
+        sender_names = await self._sender_names(user_id, messages)
+        return [self.serialize_message(message, sender_names.get(message.sender_id))
+                for message in messages]
+
+    async def iter_message_batch(self, user_id: int, session_string: str, chats: list):
+        """Yield the latest messages of several chats as each one completes.
+
+        ``chats`` holds ``(chat_id, limit)`` pairs. All chats share one
+        borrowed client with at most ``TELEGRAM_BATCH_CONCURRENCY`` requests
+        in flight, and every chat yields either its messages or its own
+        error, so a failing or slow chat does not hold back the others.
+        """
         try:
-            await self.create_client(session_string)
-
-            messages = []
-            async for message in self.client.iter_messages(chat_id, limit=limit):
-
-                sender_name = None
-                if message.sender:
-                    sender_name = f"{message.sender.first_name or ''} {
-                        message.sender.last_name or ''}".strip() or message.sender.username or "Unknown"
-
-                msg = {
-                    'id': message.id,
-                    'text': message.text or '',
-                    'date': message.date.isoformat(),
-                    'sender_id': message.sender_id,
-                    'sender': sender_name,
-                    'media': bool(message.media)
-                }
-                messages.append(msg)
+            async with self.pool.client(user_id, session_string) as client:
+                semaphore = asyncio.Semaphore(config.TELEGRAM_BATCH_CONCURRENCY)
+                tasks = [
+                    asyncio.create_task(self._fetch_batch_chat(client, semaphore, user_id, chat_id, limit))
+                    for chat_id, limit in chats
+                ]
+                try:
+                    for task in asyncio.as_completed(tasks):
+                        yield await task
+                finally:
+                    # The consumer may stop early, e.g. when the client disconnects
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+        except HTTPException as e:
+            for chat_id, _ in chats:
+                yield self._batch_error(chat_id, e.status_code, e.detail)
+
+    async def _fetch_batch_chat(self, client, semaphore: asyncio.Semaphore, user_id: int, chat_id: int, limit: int):
+        async def iter_messages():
+            with self._timed("iter_messages"):
+                return [message async for message in client.iter_messages(chat_id, limit=limit)]
+
+        try:
+            async with semaphore:
+                messages = await asyncio.wait_for(
+                    self.scheduler.call(user_id, iter_messages), config.TELEGRAM_BATCH_CHAT_TIMEOUT)
+            messages = await self._serialize_messages(user_id, messages)
+        except HTTPException as e:
+            return self._batch_error(chat_id, e.status_code, e.detail)
+        except asyncio.TimeoutError:
+            return self._batch_error(chat_id, 504, "Timed out fetching messages")
+        except Exception as e:
+            return self._batch_error(chat_id, 400, str(e))
+
+        return {'chat_id': chat_id, 'messages': messages}
+
+    @staticmethod
+    def _batch_error(chat_id: int, status_code: int, detail: str) -> dict:
+        return {'chat_id': chat_id, 'error': {'status_code': status_code, 'detail': detail}}
+
+    async def iter_export(self, user_id: int, session_string: str, chat_id: int, from_id: int = 0):
+        """Yield the whole history of a chat, oldest first, in chunks.
+
+        Only messages newer than ``from_id`` are exported, so an interrupted
+        export resumes from the last id it received. Each chunk is a single
+        Telegram request of ``TELEGRAM_EXPORT_CHUNK_SIZE`` messages, and the
+        next one is not requested until the consumer has taken the previous
+        one, which keeps memory flat for any history length.
+        """
+        async with self.pool.client(user_id, session_string) as client:
+            async def next_chunk():
+                with self._timed("iter_messages"):
+                    return [message async for message in client.iter_messages(
+                        chat_id, limit=config.TELEGRAM_EXPORT_CHUNK_SIZE, min_id=from_id, reverse=True)]
+
+            while True:
+                try:
+                    chunk = await self.scheduler.call(user_id, next_chunk)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+
+                if not chunk:
+                    return
+                chunk = await self._serialize_messages(user_id, chunk)
+                yield chunk
+                from_id = chunk[-1]['id']
+
+    async def get_media(self, user_id: int, session_string: str, chat_id: int, message_id: int,
+                        size: str = 'original'):
+        """The media of a message, from the disk cache when possible.
+
+        ``size`` is ``original`` or one of the thumbnail variants in
+        ``MEDIA_SIZES``. Cached media is returned as a MediaFile. A missing
+        thumbnail is downloaded into the cache first, while a missing
+        original comes back as a MediaStream that fills the cache as it is
+        sent, so large files start playing right away.
+        """
+        alias = (user_id, chat_id, message_id, size)
+        info = self.media.lookup(alias)
+        path = self.media.get(info.key) if info else None
+        if path:
+            return MediaFile(path, info.media_type, info.filename)
+
+        async def get_messages(client):
+            return await client.get_messages(chat_id, ids=message_id)
+
+        try:
+            message = await self._run(user_id, session_string, get_messages)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        info, media, thumb = self._describe_media(message, size)
+        self.media.remember(alias, info)
+        path = self.media.get(info.key)
+        if path:
+            return MediaFile(path, info.media_type, info.filename)
 
-            return messages
+        if thumb is None:
+            return MediaStream(
+                self._stream_media(user_id, session_string, media, info.key), info.media_type, info.filename)
 
+        async def download_media(client):
+            return await client.download_media(media, file=bytes, thumb=thumb)
+
+        try:
+            data = await self._run(user_id, session_string, download_media)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
+
+        with self.media.temp_file() as temp:
+            temp.write(data)
+        return MediaFile(self.media.commit(info.key, temp.name), info.media_type, info.filename)
+
+    async def _stream_media(self, user_id: int, session_string: str, media, key: str):
+        await self.scheduler.acquire(user_id)
+        temp = self.media.temp_file()
+        try:
+            async with self.pool.client(user_id, session_string) as client:
+                with self._timed("iter_download"):
+                    async for chunk in client.iter_download(media):
+                        temp.write(chunk)
+                        yield chunk
+            temp.close()
+            self.media.commit(key, temp.name)
         finally:
-            if self.client:
-                await self.client.disconnect()
+            if not temp.closed:
+                # Failed, or the client went away before the end
+                temp.close()
+                self.media.discard(temp.name)
+
+    @staticmethod
+    def _describe_media(message, size: str) -> tuple[MediaInfo, object, str]:
+        """Cache entry, downloadable object and thumbnail type of a message's media."""
+        from telethon import utils
+        from telethon.tl.types import DocumentAttributeFilename, VideoSize
+
+        if message is None or not message.media:
+            raise HTTPException(status_code=404, detail="Message has no media")
+
+        if message.photo:
+            media = message.photo
+            kind, sizes = 'photo', media.sizes
+            media_type, filename = 'image/jpeg', f"photo_{media.id}.jpg"
+        elif message.document:
+            media = message.document
+            kind, sizes = 'document', media.thumbs or []
+            media_type = media.mime_type or 'application/octet-stream'
+            filename = next((attribute.file_name for attribute in media.attributes
+                             if isinstance(attribute, DocumentAttributeFilename)), None)
+            filename = filename or f"document_{media.id}{utils.get_extension(media)}"
+        else:
+            raise HTTPException(status_code=404, detail="Unsupported media")
+
+        if size == 'original':
+            return MediaInfo(f"{kind}-{media.id}", media_type, filename), media, None
+
+        thumbs = sorted((thumb for thumb in sizes if hasattr(thumb, 'w') and not isinstance(thumb, VideoSize)),
+                        key=lambda thumb: max(thumb.w, thumb.h))
+        if not thumbs:
+            raise HTTPException(status_code=404, detail="Media has no thumbnail")
+        thumb = next((thumb for thumb in thumbs if max(thumb.w, thumb.h) >= MEDIA_SIZES[size]), thumbs[-1])
+        key = f"{kind}-{media.id}-{thumb.type}"
+        return MediaInfo(key, 'image/jpeg', f"{kind}_{media.id}_{thumb.type}.jpg"), media, thumb.type
+
+    async def search_messages(self, user_id: int, query: str, chat_id: int = None, limit: int = 20):
+        results = await self.message_repo.search_messages(
+            user_id, query, chat_id=chat_id, limit=limit)
+        return [
+            {
+                **self._stored_message(row),
+                'chat_id': row.chat_id,
+                'snippet': snippet,
+                'rank': rank
+            }
+            for row, snippet, rank in results
+        ]
+
+    @staticmethod
+    def chats_etag(chats: list) -> str:
+        """ETag of a dialog list, changing when any dialog gets a new top message."""
+        return make_etag([(chat['id'], chat['name'], chat['last_message']['id']) for chat in chats])
+
+    @staticmethod
+    def messages_etag(page: dict) -> str:
+        """ETag of a message page, changing with its messages and cursors.
+
+        Pages come from the local store, so edits and deletions show up once
+        the store has them: from the update hub while the account has a live
+        socket, or when a message is fetched again.
+        """
+        return make_etag(
+            [(message['id'], message['text'], message['sender'], message['media']) for message in page['messages']],
+            page['next_cursor'])
+
+    @staticmethod
+    def _is_stale(sync) -> bool:
+        age = datetime.now(UTC).replace(tzinfo=None) - sync.synced_at
+        return age.total_seconds() >= config.TELEGRAM_MESSAGE_SYNC_INTERVAL
+
+    @staticmethod
+    def _stored_message(row) -> dict:
+        return {
+            'id': row.message_id,
+            'text': row.text,
+            'date': row.date.replace(tzinfo=UTC).isoformat(),
+            'sender_id': row.sender_id,
+            'sender': row.sender,
+            'media': row.media
+        }
+
+    @staticmethod
+    def _message_page(messages: list, limit: int, before_id: int = None, after_id: int = None):
+        newest_id = messages[0]['id'] if messages else after_id
+        oldest_id = messages[-1]['id'] if messages else None
+
+        # Older history is only left to walk when a backward page came back full
+        has_older = not after_id and len(messages) >= limit
+
+        return {
+            'messages': messages,
+            'next_cursor': encode_cursor({'before_id': oldest_id}) if has_older else None,
+            'poll_cursor': encode_cursor({'after_id': newest_id or 0}),
+        }
+
+    async def logout(self, user_id: int, session_string: str):
+        async def log_out(client):
+            await client.log_out()
 
-    async def logout(self, session_string: str):
         try:
-            await self.create_client(session_string)
-            if self.client:
-                await self.client.log_out()
+            await self._run(user_id, session_string, log_out)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
         finally:
-            if self.client:
-                await self.client.disconnect()
+            await self.dialogs.invalidate(user_id)
+            await self.pool.discard(user_id)
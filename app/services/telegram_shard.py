@@ -0,0 +1,299 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.media_cache import MediaFile, MediaStream
+from app.core.sharding import ShardRouter, peer_is_trusted, read_frame, shard_router, write_frame
+from app.core.telegram_pool import TelegramClientPool, client_pool
+from app.db import SessionLocal
+from app.services.telegram import TelegramAuthService
+from app.services.telegram_sync import TelegramSyncWorker, sync_worker
+from app.services.telegram_updates import TelegramUpdateHub, update_hub
+
+# TelegramAuthService methods served by the owner of the account. Search
+# and the ETag helpers only read local state and are not forwarded
+FORWARDED = {
+    'start_authorization', 'verify_phone_code', 'verify_2fa_password', 'get_chats', 'get_messages',
+    'get_media', 'logout',
+}
+STREAMED = {'iter_message_batch', 'iter_export'}
+SUBSCRIBE = 'subscribe_updates'
+
+
+async def _read_reply(reader: asyncio.StreamReader, timeout: float):
+    """Next frame from an owner, with its errors raised as HTTPException."""
+    try:
+        frame = await asyncio.wait_for(read_frame(reader), timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Telegram worker did not answer in time")
+    except (asyncio.IncompleteReadError, ConnectionError):
+        raise HTTPException(status_code=502, detail="Telegram worker went away")
+    if isinstance(frame, dict) and 'error' in frame:
+        raise HTTPException(**frame['error'])
+    return frame
+
+
+class ShardedTelegramService:
+    """TelegramAuthService that runs account calls in the account's owner.
+
+    Calls for accounts this worker owns go to ``service`` directly; the
+    others are sent to the owning worker over its Unix socket, one
+    connection per call. HTTP errors raised there are raised here as is.
+    """
+
+    def __init__(self, service: TelegramAuthService, router: ShardRouter = shard_router):
+        self.service = service
+        self.router = router
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    async def start_authorization(self, user_id: int, phone_number: str):
+        return await self._call('start_authorization', user_id=user_id, phone_number=phone_number)
+
+    async def verify_phone_code(self, user_id: int, phone_number: str, phone_code: str, phone_code_hash: str,
+                                session_string: str = None):
+        return await self._call(
+            'verify_phone_code', user_id=user_id, phone_number=phone_number, phone_code=phone_code,
+            phone_code_hash=phone_code_hash, session_string=session_string)
+
+    async def verify_2fa_password(self, user_id: int, password: str, session_string: str = None):
+        return await self._call(
+            'verify_2fa_password', user_id=user_id, password=password, session_string=session_string)
+
+    async def get_chats(self, user_id: int, session_string: str):
+        return await self._call('get_chats', user_id=user_id, session_string=session_string)
+
+    async def get_messages(self, user_id: int, chat_id: int, session_string: str, limit: int = 100,
+                           before_id: int = None, after_id: int = None):
+        return await self._call(
+            'get_messages', user_id=user_id, chat_id=chat_id, session_string=session_string, limit=limit,
+            before_id=before_id, after_id=after_id)
+
+    def iter_message_batch(self, user_id: int, session_string: str, chats: list):
+        return self._stream('iter_message_batch', user_id=user_id, session_string=session_string, chats=chats)
+
+    def iter_export(self, user_id: int, session_string: str, chat_id: int, from_id: int = 0):
+        return self._stream(
+            'iter_export', user_id=user_id, session_string=session_string, chat_id=chat_id, from_id=from_id)
+
+    async def get_media(self, user_id: int, session_string: str, chat_id: int, message_id: int,
+                        size: str = 'original'):
+        kwargs = dict(user_id=user_id, session_string=session_string, chat_id=chat_id,
+                      message_id=message_id, size=size)
+        connection = await self.router.connect(user_id)
+        if connection is None:
+            return await self.service.get_media(**kwargs)
+
+        reader, writer = connection
+        try:
+            await write_frame(writer, {'method': 'get_media', 'kwargs': kwargs})
+            frame = await self._read(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if 'file' in frame:
+            # Same host: the owner's cache directory is readable from here,
+            # but nothing outside it is served on a peer's word
+            writer.close()
+            media = MediaFile(**frame['file'])
+            if not self.service.media.contains(media.path):
+                raise HTTPException(status_code=502, detail="Telegram worker sent a file outside the media cache")
+            return media
+        return MediaStream(self._chunks(reader, writer), **frame['media'])
+
+    async def logout(self, user_id: int, session_string: str):
+        return await self._call('logout', user_id=user_id, session_string=session_string)
+
+    async def _call(self, method: str, **kwargs):
+        connection = await self.router.connect(kwargs['user_id'])
+        if connection is None:
+            return await getattr(self.service, method)(**kwargs)
+
+        reader, writer = connection
+        try:
+            await write_frame(writer, {'method': method, 'kwargs': kwargs})
+            return (await self._read(reader))['result']
+        finally:
+            writer.close()
+
+    async def _stream(self, method: str, **kwargs):
+        connection = await self.router.connect(kwargs['user_id'])
+        if connection is None:
+            async for item in getattr(self.service, method)(**kwargs):
+                yield item
+            return
+
+        reader, writer = connection
+        try:
+            await write_frame(writer, {'method': method, 'kwargs': kwargs})
+            while 'end' not in (frame := await self._read(reader)):
+                yield frame['item']
+        finally:
+            writer.close()
+
+    async def _chunks(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while isinstance(frame := await self._read(reader), bytes):
+                yield frame
+        finally:
+            writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        return await _read_reply(reader, self.router.timeout)
+
+
+class RemoteUpdates:
+    """Queue-like reader of the updates an owner pushes over its socket.
+
+    Nothing is buffered here: a slow socket stops reading, and the owner's
+    queue drops its oldest updates as for a local one.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+
+    async def get(self) -> dict:
+        try:
+            frame = await read_frame(self.reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return {"type": "error", "detail": "Telegram worker went away"}
+        if 'error' in frame:
+            return {"type": "error", "detail": frame['error']['detail']}
+        return frame['item']
+
+
+class ShardedUpdateHub:
+    """TelegramUpdateHub that subscribes in the owner of the account.
+
+    The owner holds the account's client, so a socket accepted by another
+    worker gets its updates relayed over the owner's Unix socket instead of
+    opening a second connection on the same auth key.
+    """
+
+    def __init__(self, hub: TelegramUpdateHub, router: ShardRouter = shard_router):
+        self.hub = hub
+        self.router = router
+
+    @asynccontextmanager
+    async def subscribe(self, key, session_string: str):
+        connection = await self.router.connect(key)
+        if connection is None:
+            async with self.hub.subscribe(key, session_string) as queue:
+                yield queue
+            return
+
+        reader, writer = connection
+        try:
+            await write_frame(writer, {'method': SUBSCRIBE, 'kwargs': {'user_id': key, 'session_string': session_string}})
+            # Raises when the owner could not subscribe, like a local start
+            await _read_reply(reader, self.router.timeout)
+            yield RemoteUpdates(reader)
+        finally:
+            writer.close()
+
+
+class TelegramShardServer:
+    """Serves the calls other workers forward for the accounts this one owns.
+
+    Each connection carries one call, answered on a service of its own.
+    Streamed results and update subscriptions end as soon as the caller
+    disconnects.
+    """
+
+    def __init__(self, router: ShardRouter, pool: TelegramClientPool, sessions: async_sessionmaker = SessionLocal,
+                 sync: TelegramSyncWorker = None, updates: TelegramUpdateHub = None):
+        self.router = router
+        self.pool = pool
+        self.sessions = sessions
+        self.sync = sync
+        self.updates = updates
+
+        self._server = None
+
+    async def start(self):
+        if not self.router.enabled or self._server:
+            return
+        self.router.secure_directory()
+        # A socket of the same name can only be left over from a dead worker
+        self.router.remove(self.router.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.router.path)
+        self.router.refresh()
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Other workers rehash its accounts as soon as the socket is gone
+        self.router.remove(self.router.path)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if not peer_is_trusted(writer):
+                return
+            request = await read_frame(reader)
+            async with self.sessions() as db:
+                service = TelegramAuthService(self.pool, db, sessions=self.sessions)
+                sending = asyncio.create_task(self._send(writer, self._frames(service, **request)))
+                disconnected = asyncio.create_task(reader.read(1))
+                await asyncio.wait({sending, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                for task in (sending, disconnected):
+                    task.cancel()
+                await asyncio.gather(sending, disconnected, return_exceptions=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, frames):
+        async for frame in frames:
+            await write_frame(writer, frame)
+
+    async def _frames(self, service: TelegramAuthService, method: str, kwargs: dict):
+        try:
+            if method == SUBSCRIBE and self.updates:
+                async with self.updates.subscribe(kwargs['user_id'], kwargs['session_string']) as queue:
+                    yield {'ready': True}
+                    while True:
+                        yield {'item': await queue.get()}
+            if method in STREAMED:
+                async for item in getattr(service, method)(**kwargs):
+                    yield {'item': item}
+                yield {'end': True}
+                return
+            if method not in FORWARDED:
+                raise HTTPException(status_code=400, detail=f"Unknown method {method}")
+
+            result = await getattr(service, method)(**kwargs)
+            self._track(method, kwargs)
+            if isinstance(result, MediaFile):
+                yield {'file': asdict(result)}
+            elif isinstance(result, MediaStream):
+                yield {'media': {'media_type': result.media_type, 'filename': result.filename}}
+                async for chunk in result.chunks:
+                    yield chunk
+                yield {'end': True}
+            else:
+                yield {'result': result}
+        except HTTPException as e:
+            yield {'error': {'status_code': e.status_code, 'detail': e.detail, 'headers': e.headers}}
+        except Exception as e:
+            yield {'error': {'status_code': 500, 'detail': str(e)}}
+
+    def _track(self, method: str, kwargs: dict):
+        # Keep background sync with the owner, which hosts the client
+        if not self.sync:
+            return
+        if method in ('get_chats', 'get_messages'):
+            self.sync.touch(kwargs['user_id'], kwargs['session_string'])
+        elif method == 'logout':
+            self.sync.forget(kwargs['user_id'])
+
+
+shard_server = TelegramShardServer(shard_router, client_pool, sync=sync_worker, updates=update_hub)
@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Callable
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core import config
+from app.core.dialog_cache import DialogCache, dialog_cache
+from app.core.sharding import shard_router
+from app.core.telegram_pool import TelegramClientPool, client_pool
+from app.db import SessionLocal
+from app.repositories.telegram import TelegramAccountRepository
+from app.services.telegram import TelegramAuthService
+
+
+class SyncState:
+    def __init__(self, session_string: str, last_active: float, next_sync_at: float):
+        self.session_string = session_string
+        self.last_active = last_active
+        self.next_sync_at = next_sync_at
+        self.failures = 0
+
+
+class TelegramSyncWorker:
+    """Background prefetching of dialogs and recent messages of active accounts.
+
+    An account is active for ``active_window`` seconds after its Telegram
+    data was last read. Every ``interval`` seconds it is due for a sync;
+    due accounts wait in a priority queue, most recently active first, and
+    at most ``concurrency`` of them sync at a time. A failed sync backs the
+    account off exponentially up to ``max_backoff``, and at least for as
+    long as a rate limit's Retry-After asks.
+
+    With ``owns``, only accounts it accepts are synced, so that each
+    account is synced by the worker process owning it.
+    """
+
+    def __init__(self, pool: TelegramClientPool, dialogs: DialogCache, sessions: async_sessionmaker = SessionLocal,
+                 concurrency: int = 4, interval: float = 60, active_window: float = 900, chats: int = 5,
+                 messages: int = 100, max_backoff: float = 900, shutdown_timeout: float = 10,
+                 owns: Callable[[int], bool] = None):
+        self.pool = pool
+        self.dialogs = dialogs
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.interval = interval
+        self.active_window = active_window
+        self.chats = chats
+        self.messages = messages
+        self.max_backoff = max_backoff
+        self.shutdown_timeout = shutdown_timeout
+        self.owns = owns or (lambda user_id: True)
+
+        self._accounts: dict[int, SyncState] = {}
+        self._queue: list = []
+        self._queued: set = set()
+        self._syncing: set = set()
+        self._running: set = set()
+        self._wakeup = None
+        self._task = None
+
+    def touch(self, user_id: int, session_string: str):
+        """Record a read of the account's data, keeping it in the sync set."""
+        if not self.owns(user_id):
+            return
+        now = time.monotonic()
+        state = self._accounts.get(user_id)
+        if state is None or state.session_string != session_string:
+            # The read that activates an account already loads fresh data
+            state = self._accounts[user_id] = SyncState(session_string, now, now + self.interval)
+        state.last_active = now
+
+    def forget(self, user_id: int):
+        self._accounts.pop(user_id, None)
+
+    async def start(self):
+        if not self.concurrency or (self._task and not self._task.done()):
+            return
+        await self._load_recent_accounts()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch_forever())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._running:
+            # Syncs in flight get a moment to finish their writes
+            _, pending = await asyncio.wait(self._running, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self._queue.clear()
+        self._queued.clear()
+
+    async def _load_recent_accounts(self):
+        # After a restart, accounts whose chats were synced recently are
+        # taken as active, so they are warm before their first read
+        now = datetime.now(UTC).replace(tzinfo=None)
+        try:
+            async with self.sessions() as db:
+                accounts = await TelegramAccountRepository(db).get_recently_synced_accounts(
+                    now - timedelta(seconds=self.active_window))
+        except HTTPException as e:
+            print("====== Error loading accounts to sync ======", e.detail)
+            return
+
+        monotonic_now = time.monotonic()
+        for account, synced_at in accounts:
+            if not self.owns(account.user_id):
+                continue
+            last_active = monotonic_now - (now - synced_at).total_seconds()
+            self._accounts.setdefault(
+                account.user_id, SyncState(account.session_string, last_active, monotonic_now))
+
+    async def _dispatch_forever(self):
+        while True:
+            self._wakeup.clear()
+            self._enqueue_due()
+            while self._queue and len(self._running) < self.concurrency:
+                _, user_id = heapq.heappop(self._queue)
+                self._queued.discard(user_id)
+                state = self._accounts.get(user_id)
+                if state is None:
+                    continue
+                task = asyncio.create_task(self._sync(user_id, state))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._next_due())
+            except asyncio.TimeoutError:
+                pass
+
+    def _enqueue_due(self):
+        now = time.monotonic()
+        for user_id, state in list(self._accounts.items()):
+            # Accounts also leave when another worker took them over
+            if now - state.last_active > self.active_window or not self.owns(user_id):
+                del self._accounts[user_id]
+                continue
+            if state.next_sync_at <= now and user_id not in self._queued and user_id not in self._syncing:
+                heapq.heappush(self._queue, (-state.last_active, user_id))
+                self._queued.add(user_id)
+
+    def _next_due(self) -> float:
+        waiting = [state.next_sync_at for user_id, state in self._accounts.items()
+                   if user_id not in self._queued and user_id not in self._syncing]
+        if not waiting:
+            return self.interval
+        return min(max(min(waiting) - time.monotonic(), 0.1), self.interval)
+
+    async def _sync(self, user_id: int, state: SyncState):
+        self._syncing.add(user_id)
+        try:
+            await self._sync_account(user_id, state.session_string)
+        except Exception as e:
+            state.failures += 1
+            backoff = min(self.interval * 2 ** state.failures, self.max_backoff)
+            retry_after = (getattr(e, "headers", None) or {}).get("Retry-After")
+            if retry_after:
+                backoff = max(backoff, float(retry_after))
+            state.next_sync_at = time.monotonic() + backoff
+            print("====== Error syncing Telegram account ======", user_id, getattr(e, "detail", e))
+        else:
+            state.failures = 0
+            state.next_sync_at = time.monotonic() + self.interval
+        finally:
+            self._syncing.discard(user_id)
+            self._wakeup.set()
+
+    async def _sync_account(self, user_id: int, session_string: str):
+        async with self.sessions() as db:
+            service = TelegramAuthService(self.pool, db, dialogs=self.dialogs, sessions=self.sessions)
+            chats = await service.refresh_chats(user_id, session_string)
+            # Dialogs come most recent first
+            for chat in chats[:self.chats]:
+                await service.get_messages(user_id, chat['id'], session_string, limit=self.messages)
+
+
+sync_worker = TelegramSyncWorker(
+    client_pool,
+    dialog_cache,
+    concurrency=config.TELEGRAM_SYNC_CONCURRENCY,
+    interval=config.TELEGRAM_SYNC_INTERVAL,
+    active_window=config.TELEGRAM_SYNC_ACTIVE_WINDOW,
+    chats=config.TELEGRAM_SYNC_CHATS,
+    messages=config.TELEGRAM_SYNC_MESSAGES,
+    max_backoff=config.TELEGRAM_SYNC_MAX_BACKOFF,
+    owns=shard_router.owns,
+)
@@ -0,0 +1,174 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.dialog_cache import DialogCache, dialog_cache
+from app.core.telegram_pool import TelegramClientPool, client_pool
+from app.db import SessionLocal
+from app.repositories.message import TelegramMessageRepository
+from app.services.telegram import TelegramAuthService
+
+
+class UpdateSubscription:
+    """Telethon update handlers of one account, shared by all its sockets.
+
+    Edits and deletions are also applied to the local message store, which
+    otherwise only learns about new messages.
+    """
+
+    def __init__(self, key, session_string: str, pool: TelegramClientPool, dialogs: DialogCache,
+                 sessions: async_sessionmaker = SessionLocal, on_failed=None):
+        self.key = key
+        self.session_string = session_string
+        self.pool = pool
+        self.dialogs = dialogs
+        self.sessions = sessions
+        # Called with the subscription when its handlers stop on an error
+        self.on_failed = on_failed
+        self.queues: set[asyncio.Queue] = set()
+
+        self._ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """Start the handlers once and wait until they are receiving."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await asyncio.shield(self._ready)
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def publish(self, update: dict):
+        for queue in self.queues:
+            if queue.full():
+                # A slow socket loses its oldest update rather than the newest
+                queue.get_nowait()
+            queue.put_nowait(update)
+
+    async def _run(self):
+        from telethon import events
+
+        handlers = [
+            (self._on_new_message, events.NewMessage()),
+            (self._on_message_edited, events.MessageEdited()),
+            (self._on_message_deleted, events.MessageDeleted()),
+        ]
+        try:
+            # Holding the borrow pins the client in the pool while subscribed
+            async with self.pool.client(self.key, self.session_string) as client:
+                for callback, event in handlers:
+                    client.add_event_handler(callback, event)
+                try:
+                    # Telegram starts pushing updates after the first request
+                    await client.get_me()
+                    self._ready.set_result(None)
+                    stop = asyncio.create_task(self._stop.wait())
+                    try:
+                        await asyncio.wait([stop, client.disconnected], return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        stop.cancel()
+                    if not self._stop.is_set():
+                        # Raises the error the connection was lost with, if any
+                        client.disconnected.result()
+                        raise ConnectionError("Telegram connection closed")
+                finally:
+                    for callback, event in handlers:
+                        client.remove_event_handler(callback, event)
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                self.publish({"type": "error", "detail": str(e)})
+            if self.on_failed:
+                self.on_failed(self)
+
+    async def _on_new_message(self, event):
+        await self.dialogs.invalidate(self.key)
+        self.publish({
+            "type": "new_message",
+            "chat_id": event.chat_id,
+            "message": TelegramAuthService.serialize_message(event.message),
+        })
+
+    async def _on_message_edited(self, event):
+        message = TelegramAuthService.serialize_message(event.message)
+        await self._store(lambda repo: repo.update_message(self.key, event.chat_id, message))
+        self.publish({
+            "type": "message_edited",
+            "chat_id": event.chat_id,
+            "message": message,
+        })
+
+    async def _on_message_deleted(self, event):
+        await self.dialogs.invalidate(self.key)
+        await self._store(lambda repo: repo.delete_messages(self.key, event.chat_id, event.deleted_ids))
+        self.publish({
+            "type": "message_deleted",
+            "chat_id": event.chat_id,
+            "message_ids": event.deleted_ids,
+        })
+
+    async def _store(self, write):
+        # The sockets still get the update when the store cannot take it
+        try:
+            async with self.sessions() as db:
+                await write(TelegramMessageRepository(db))
+        except HTTPException as e:
+            print("====== Error storing update ======", e.detail)
+
+
+class TelegramUpdateHub:
+    """Fan-out of live Telegram updates to connected sockets.
+
+    Each account has at most one upstream subscription, started by its first
+    socket and stopped when its last socket leaves.
+    """
+
+    def __init__(self, pool: TelegramClientPool, dialogs: DialogCache, queue_size: int = 100,
+                 sessions: async_sessionmaker = SessionLocal):
+        self.pool = pool
+        self.dialogs = dialogs
+        self.queue_size = queue_size
+        self.sessions = sessions
+
+        self._subscriptions: dict = {}
+
+    @asynccontextmanager
+    async def subscribe(self, key, session_string: str):
+        """Yield a queue receiving the account's updates while open."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscription = self._subscriptions.get(key)
+        if subscription is None or subscription.session_string != session_string:
+            subscription = UpdateSubscription(
+                key, session_string, self.pool, self.dialogs, self.sessions, on_failed=self._forget)
+            self._subscriptions[key] = subscription
+
+        subscription.queues.add(queue)
+        try:
+            await subscription.start()
+            yield queue
+        finally:
+            subscription.queues.discard(queue)
+            if not subscription.queues:
+                self._forget(subscription)
+                await subscription.stop()
+
+    def _forget(self, subscription: UpdateSubscription):
+        # A failed subscription is dropped at once, so that new sockets of
+        # the account start a fresh one instead of joining it
+        if self._subscriptions.get(subscription.key) is subscription:
+            del self._subscriptions[subscription.key]
+
+    async def close(self):
+        subscriptions = list(self._subscriptions.values())
+        self._subscriptions.clear()
+        await asyncio.gather(*(subscription.stop() for subscription in subscriptions))
+
+
+update_hub = TelegramUpdateHub(client_pool, dialog_cache)
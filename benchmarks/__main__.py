@@ -0,0 +1,90 @@
+"""Benchmark the API in process against a fake Telegram.
+
+    python -m benchmarks                    # compare with benchmarks/baseline.json
+    python -m benchmarks --update-baseline  # record a new baseline
+
+Runs offline: Telegram is faked and the database is a throwaway SQLite
+file. Exits with status 1 when a scenario regressed against the baseline,
+or when a fresh worker took longer than the target to answer its first
+request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def parse_args():
+    from benchmarks.suite import Params
+
+    defaults = Params()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed relative regression, e.g. 0.3 for 30%%")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="uvicorn workers started to time cold starts, 0 to skip")
+    parser.add_argument("--startup-target-ms", type=float, default=2000,
+                        help="time to first request a fresh worker must meet")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Settings are read when the app is imported
+    database_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{database_dir.name}/benchmark.db"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["TELEGRAM_SYNC_CONCURRENCY"] = "0"
+
+    # Timed before the suite imports the app into this process
+    startup = None
+    if args.startup_runs:
+        from benchmarks.startup import measure_startup
+        startup = measure_startup(args.startup_runs)
+
+    from app.main import app
+    from benchmarks.suite import Params, compare, report, run_suite
+
+    params = Params(**{name: getattr(args, name) for name in asdict(Params())})
+    results = report(params, asyncio.run(run_suite(app, params)))
+
+    print(f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>10}")
+    for name, result in results["scenarios"].items():
+        print(f"{name:<12}{result['throughput']:>10}{result['p50_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['peak_rss_mb']:>10}")
+
+    failures = []
+    if startup:
+        results["startup"] = startup
+        print(f"startup: import {startup['import_ms']} ms, first request {startup['first_request_ms']} ms "
+              f"(target {args.startup_target_ms:g} ms)")
+        if startup["first_request_ms"] > args.startup_target_ms:
+            failures.append(f"startup: first request after {startup['first_request_ms']} ms "
+                            f"> target {args.startup_target_ms:g} ms")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    elif not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; record one with --update-baseline")
+    else:
+        failures += compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, UTC
+
+from app.core.dialog_cache import DialogCache
+from app.core.rate_limit import TelegramScheduler
+from app.core.singleflight import SingleFlight
+from app.services.telegram import TelegramAuthService
+
+
+class User:
+    def __init__(self, id: int, first_name: str = None, last_name: str = None, username: str = None):
+        self.id = id
+        self.first_name = first_name or f"User {id}"
+        self.last_name = last_name
+        self.username = username or f"user{id}"
+
+
+class Message:
+    def __init__(self, id: int, text: str = None, sender: User = None):
+        self.id = id
+        self.text = text or f"message {id}"
+        self.date = datetime(2024, 1, 1, tzinfo=UTC) + timedelta(minutes=id)
+        self.sender_id = sender.id if sender else 1
+        self.sender = sender
+        self.media = None
+        self.photo = None
+        self.document = None
+
+
+class Dialog:
+    def __init__(self, id: int, message: Message = None):
+        self.id = id
+        self.name = f"Chat {id}"
+        self.entity = User(id)
+        self.message = message
+
+
+class SentCode:
+    phone_code_hash = "hash"
+
+
+class Session:
+    def __init__(self, string: str):
+        self.string = string
+
+    def save(self):
+        return self.string
+
+
+class FakeClient:
+    """Deterministic stand-in for a Telethon client, shared by the tests and the benchmarks.
+
+    Every chat holds the same ``history``, newest message first, which tests
+    may edit in place. Each request of up to 100 messages waits ``latency``
+    seconds, or ``delays[chat_id]``, roughly one Telegram round trip; chats
+    in ``errors`` raise instead. With ``senders`` the messages cycle through
+    that many distinct users, otherwise they come without a sender attached.
+    The latest reads and downloads are recorded in ``calls``.
+    """
+
+    thumbnail = b"thumb"
+    file = b"original"
+    chunk_size = 3
+
+    def __init__(self, history_size: int = 250, dialogs: int = 0, latency: float = 0,
+                 senders: int = 0, session_string: str = None):
+        self.history = [
+            Message(id, sender=User(1000 + id % senders) if senders else None)
+            for id in range(history_size, 0, -1)
+        ]
+        self.dialogs = dialogs
+        self.latency = latency
+        self.delays = {}
+        self.errors = {}
+        self.gate = None
+        # Bounded, as benchmark runs make requests by the thousand
+        self.calls = deque(maxlen=1000)
+        self.active = 0
+        self.max_active = 0
+        self.handlers = []
+        self.session = Session(session_string or "fake-session")
+        self.connected = False
+        self.connects = 0
+        self._disconnected = None
+
+    def message(self, id: int) -> Message:
+        return next((message for message in self.history if message.id == id), None)
+
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self):
+        self.connects += 1
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    @property
+    def disconnected(self) -> asyncio.Future:
+        if self._disconnected is None:
+            self._disconnected = asyncio.get_running_loop().create_future()
+        return self._disconnected
+
+    def add_event_handler(self, callback, event):
+        self.handlers.append(callback)
+
+    def remove_event_handler(self, callback, event):
+        self.handlers.remove(callback)
+
+    async def get_me(self):
+        return None
+
+    async def iter_dialogs(self):
+        await asyncio.sleep(self.latency)
+        for id in range(1, self.dialogs + 1):
+            yield Dialog(id, self.history[0] if self.history else None)
+
+    async def iter_messages(self, chat_id, limit=None, offset_id=0, min_id=0, max_id=0, reverse=False):
+        self.calls.append({"method": "iter_messages", "offset_id": offset_id, "min_id": min_id})
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            if chat_id in self.errors:
+                raise self.errors[chat_id]
+            messages = [m for m in self.history
+                        if m.id > min_id and (not max_id or m.id < max_id) and (not offset_id or m.id < offset_id)]
+            if reverse:
+                messages.reverse()
+            for count, message in enumerate(messages[:limit]):
+                if count % 100 == 0:
+                    await asyncio.sleep(self.delays.get(chat_id, self.latency))
+                yield message
+        finally:
+            self.active -= 1
+
+    async def get_messages(self, chat_id, ids=None):
+        self.calls.append({"method": "get_messages", "ids": ids})
+        return self.message(ids)
+
+    async def download_media(self, media, file=None, thumb=None):
+        self.calls.append({"method": "download_media", "thumb": thumb})
+        return self.thumbnail
+
+    async def iter_download(self, media):
+        self.calls.append({"method": "iter_download"})
+        for start in range(0, len(self.file), self.chunk_size):
+            yield self.file[start:start + self.chunk_size]
+
+    async def send_code_request(self, phone_number):
+        await asyncio.sleep(self.latency)
+        return SentCode()
+
+    async def sign_in(self, phone_number=None, code=None, phone_code_hash=None, password=None):
+        await asyncio.sleep(self.latency)
+
+    async def log_out(self):
+        await asyncio.sleep(self.latency)
+
+
+class FakePool:
+    """Lends the same ``fake_client`` to every caller, counting the borrows."""
+
+    def __init__(self, client: FakeClient = None):
+        self.fake_client = client or FakeClient()
+        self.borrows = 0
+
+    @asynccontextmanager
+    async def client(self, key, session_string: str = None):
+        self.borrows += 1
+        yield self.fake_client
+
+    async def discard(self, key):
+        pass
+
+
+class FakeTelegramBackend:
+    """Builds TelegramAuthService instances backed by a fake Telegram.
+
+    Only the pool is faked, so the caches, message store, single flight and
+    scheduler of the real service are all part of what gets measured. The
+    caches are private to the backend, so runs do not share warm state.
+    """
+
+    def __init__(self, dialogs: int = 100, history_size: int = 1000, latency: float = 0.02):
+        self.pool = FakePool(FakeClient(history_size, dialogs, latency, senders=20))
+        self.dialogs = DialogCache()
+        self.flights = SingleFlight()
+        # Rate limiting would measure the limits, not the code
+        self.scheduler = TelegramScheduler(
+            global_rate=1e9, global_burst=1e9, account_rate=1e9, account_burst=1e9)
+
+    def service(self, db) -> TelegramAuthService:
+        return TelegramAuthService(
+            self.pool, db, dialogs=self.dialogs, flights=self.flights, scheduler=self.scheduler)
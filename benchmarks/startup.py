@@ -0,0 +1,71 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_APP = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def _environment(database: str) -> dict:
+    return os.environ | {
+        "DATABASE_URL": f"sqlite+aiosqlite:///{database}",
+        "TELEGRAM_SYNC_CONCURRENCY": "0",
+    }
+
+
+def _first_request(env: dict, socket: str, timeout: float) -> float:
+    """Seconds from spawning a uvicorn worker until it answered a request."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--uds", socket, "--log-level", "warning"],
+        cwd=ROOT, env=env)
+    try:
+        with httpx.Client(transport=httpx.HTTPTransport(uds=socket), base_url="http://startup") as client:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+                try:
+                    # Routing, dependencies and a database query, but no bcrypt
+                    client.post("/auth/login", json={"email": "nobody@example.com", "password": "x"})
+                    return time.perf_counter() - start
+                except httpx.TransportError:
+                    time.sleep(0.005)
+        raise RuntimeError(f"No response within {timeout} seconds")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure_startup(runs: int = 5, timeout: float = 30) -> dict:
+    """Median cold start of a worker over ``runs`` fresh processes.
+
+    ``import_ms`` is the time to import the app, and ``first_request_ms``
+    the time from spawning uvicorn until its first response. Workers start
+    against a database migrated beforehand, as when scaling out, and with
+    the caller's SCHEMA_AUTO_CREATE.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        env = _environment(f"{directory}/startup.db")
+        socket = f"{directory}/api.sock"
+        # Also compiles the bytecode, which the measured runs then reuse
+        subprocess.run([sys.executable, "-m", "app.migrations"], cwd=ROOT, env=env, check=True)
+
+        imports, first_requests = [], []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_APP], cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+            imports.append(float(output.stdout.split()[-1]))
+            first_requests.append(_first_request(env, socket, timeout))
+
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "first_request_ms": round(statistics.median(first_requests) * 1000, 1),
+    }
@@ -0,0 +1,158 @@
+import asyncio
+import resource
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+import httpx
+from fastapi import Depends, FastAPI
+
+PASSWORD = "benchmark-password"
+SCENARIOS = ("login", "auth_flow", "chats", "messages")
+
+
+@dataclass
+class Params:
+    requests: int = 200
+    concurrency: int = 20
+    dialogs: int = 100
+    history_size: int = 1000
+    latency: float = 0.02
+    bcrypt_rounds: int = 4
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def _measure(total: int, concurrency: int, operation) -> dict:
+    latencies = []
+    next_index = iter(range(total))
+
+    async def worker():
+        for index in next_index:
+            start = time.perf_counter()
+            await operation(index)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": total,
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(percentiles[49] * 1000, 2),
+        "p99_ms": round(percentiles[98] * 1000, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _checked(response: httpx.Response) -> httpx.Response:
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.method} {response.request.url}: "
+                           f"{response.status_code} {response.text}")
+    return response
+
+
+async def run_suite(app: FastAPI, params: Params) -> dict:
+    """Drive the app in process against a fake Telegram and time each scenario.
+
+    Each scenario runs ``params.requests`` operations from
+    ``params.concurrency`` concurrent clients, after one unmeasured round
+    that warms it up.
+    """
+    # Imported here: the app's settings are read on import, and the CLI
+    # sets them after importing this module
+    from app.deps import get_db, get_telegram_service
+    from benchmarks.fake_telegram import FakeTelegramBackend
+
+    backend = FakeTelegramBackend(params.dialogs, params.history_size, params.latency)
+
+    def get_fake_telegram_service(db=Depends(get_db)):
+        return backend.service(db)
+
+    app.dependency_overrides[get_telegram_service] = get_fake_telegram_service
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                return await _run_scenarios(client, params)
+    finally:
+        app.dependency_overrides.pop(get_telegram_service, None)
+
+
+async def _run_scenarios(client: httpx.AsyncClient, params: Params) -> dict:
+    # One user per concurrent client, so accounts are not serialized on
+    # each other's locks
+    users = [f"benchmark-{index}@example.com" for index in range(params.concurrency)]
+    headers = []
+    for email in users:
+        response = await client.post("/auth/register", json={"email": email, "password": PASSWORD})
+        if response.status_code == 409:
+            response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        headers.append({"Authorization": f"Bearer {_checked(response).json()['access_token']}"})
+
+    async def login(index):
+        _checked(await client.post(
+            "/auth/login", json={"email": users[index % len(users)], "password": PASSWORD}))
+
+    async def auth_flow(index):
+        user_headers = headers[index % len(headers)]
+        code = _checked(await client.post(
+            "/telegram/auth/start", json={"phone_number": "+10000000000"}, headers=user_headers)).json()
+        _checked(await client.post("/telegram/auth/verify-code", json={
+            "phone_number": "+10000000000",
+            "phone_code": "12345",
+            "phone_code_hash": code["phone_code_hash"],
+            "session_string": code["session_string"],
+        }, headers=user_headers))
+
+    async def chats(index):
+        _checked(await client.get("/telegram/chats", headers=headers[index % len(headers)]))
+
+    async def messages(index):
+        chat_id = index % params.dialogs + 1
+        _checked(await client.get(
+            f"/telegram/chats/{chat_id}/messages?limit=50", headers=headers[index % len(headers)]))
+
+    operations = {"login": login, "auth_flow": auth_flow, "chats": chats, "messages": messages}
+    results = {}
+    for name in SCENARIOS:
+        await _measure(params.concurrency, params.concurrency, operations[name])
+        results[name] = await _measure(params.requests, params.concurrency, operations[name])
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of ``results`` against ``baseline``, as readable lines.
+
+    Throughput may drop and latency or memory may grow by ``tolerance``
+    (a fraction) before it counts; latencies also get 1 ms of slack, which
+    is below what timer noise produces on sub-millisecond requests.
+    """
+    if baseline.get("params") != results.get("params"):
+        return [f"parameters differ from the baseline: {baseline.get('params')} != {results.get('params')}"]
+
+    regressions = []
+    for name, base in baseline["scenarios"].items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            regressions.append(f"{name}: missing")
+            continue
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']}/s < baseline {base['throughput']}/s")
+        for metric in ("p50_ms", "p99_ms"):
+            if current[metric] > max(base[metric] * (1 + tolerance), base[metric] + 1):
+                regressions.append(f"{name}: {metric} {current[metric]} > baseline {base[metric]}")
+        if current["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak_rss_mb {current['peak_rss_mb']} > baseline {base['peak_rss_mb']}")
+    return regressions
+
+
+def report(params: Params, scenarios: dict) -> dict:
+    return {"params": asdict(params), "scenarios": scenarios}
@@ -1,8 +1,20 @@
+import os
+import tempfile
+
 import pytest
 
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 
+# Settings are read when the app is imported: run it against a throwaway
+# database, with cheap bcrypt and without the background sync
+_database_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_database_dir.name}/test.db"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["TELEGRAM_SYNC_CONCURRENCY"] = "0"
 
+from app.db import Base
 from app.main import app
 
 
@@ -10,3 +22,18 @@ from app.main import app
 def client():
     with TestClient(app) as client:
         yield client
+
+
+@pytest.fixture(scope="function")
+async def sessions():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture(scope="function")
+async def db(sessions):
+    async with sessions() as session:
+        yield session
@@ -0,0 +1,30 @@
+from benchmarks.suite import SCENARIOS, Params, compare, report, run_suite
+from benchmarks.startup import measure_startup
+from app.main import app
+
+
+async def test_suite_runs_every_scenario_against_the_fake_backend():
+    params = Params(requests=4, concurrency=2, dialogs=3, history_size=120, latency=0)
+
+    results = await run_suite(app, params)
+
+    assert list(results) == list(SCENARIOS)
+    assert all(result["requests"] == 4 and result["throughput"] > 0 for result in results.values())
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    params = Params()
+    baseline = report(params, {"chats": {"throughput": 100, "p50_ms": 10, "p99_ms": 20, "peak_rss_mb": 100}})
+
+    close = report(params, {"chats": {"throughput": 90, "p50_ms": 11, "p99_ms": 21, "peak_rss_mb": 105}})
+    assert compare(close, baseline, tolerance=0.3) == []
+
+    slower = report(params, {"chats": {"throughput": 50, "p50_ms": 10, "p99_ms": 40, "peak_rss_mb": 100}})
+    assert len(compare(slower, baseline, tolerance=0.3)) == 2
+
+
+def test_startup_is_measured_in_fresh_workers():
+    startup = measure_startup(runs=1)
+
+    assert startup["runs"] == 1
+    assert 0 < startup["import_ms"] < startup["first_request_ms"]
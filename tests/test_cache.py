@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.cache import Cache, MemoryBackend, RedisBackend, SQLiteBackend, create_backend
+from app.core.cache.redis import encode_command, read_reply
+from app.core.dialog_cache import DialogCache
+
+
+class FakeRedis:
+    """Stand-in for a Redis server, speaking just the commands the cache uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                command, *args = await read_reply(reader)
+                writer.write(self._execute(command.upper(), args))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def _execute(self, command: bytes, args: list) -> bytes:
+        if command == b"GET":
+            value, expires_at = self.data.get(args[0], (None, 0))
+            if value is None or time.time() >= expires_at:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET":
+            self.data[args[0]] = (args[1], time.time() + int(args[3]) / 1000)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % (self.data.pop(args[0], None) is not None)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.fixture
+async def redis_port():
+    redis = FakeRedis()
+    yield await redis.start()
+    await redis.close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+async def workers(request, tmp_path, redis_port):
+    """Backends of two workers sharing one store."""
+    if request.param == "sqlite":
+        backends = [SQLiteBackend(str(tmp_path / "cache.db")) for _ in range(2)]
+    else:
+        backends = [RedisBackend(port=redis_port) for _ in range(2)]
+    yield backends
+    for backend in backends:
+        await backend.close()
+
+
+async def test_values_expire_and_are_deleted():
+    backend = MemoryBackend()
+    await backend.set("a", {"n": 1}, 60)
+    await backend.set("b", 1, -1)
+
+    assert await backend.get("a") == {"n": 1}
+    assert await backend.get("b") is None
+    await backend.delete("a")
+    assert await backend.get("a") is None
+
+
+async def test_workers_share_values_and_invalidations(workers):
+    first, second = (Cache(backend, "dialogs") for backend in workers)
+    generation = await first.generation(1)
+    await first.set(1, [{"id": 1}], 60)
+
+    assert await second.get(1) == [{"id": 1}]
+    assert await second.generation(1) == generation
+    assert await Cache(workers[1], "other").get(1) is None
+
+    await second.invalidate(1)
+    assert await first.get(1) is None
+    assert await first.generation(1) != generation
+
+
+async def test_load_finishing_after_another_workers_invalidation_is_dropped(workers):
+    first, second = (DialogCache(Cache(backend, "dialogs")) for backend in workers)
+
+    async def loader():
+        await second.invalidate(1)
+        return ["stale"]
+
+    assert await first.get(1, loader) == ["stale"]
+    assert await first.peek(1) is None
+
+
+def test_backends_are_chosen_by_url(tmp_path):
+    assert create_backend("memory://") is not create_backend("memory://")
+
+    url = f"sqlite:///{tmp_path}/cache.db"
+    assert create_backend(url) is create_backend(url)
+    assert create_backend(url).path == f"{tmp_path}/cache.db"
+
+    redis = create_backend("redis://:secret@cache:6380/2")
+    assert (redis.host, redis.port, redis.db, redis.password) == ("cache", 6380, 2, "secret")
+
+
+def test_commands_are_encoded_as_resp_arrays():
+    assert encode_command("SET", "k", b"v", "PX", 10) == b"*5\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n$2\r\nPX\r\n$2\r\n10\r\n"
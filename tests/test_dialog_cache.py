@@ -0,0 +1,45 @@
+import asyncio
+
+from app.core.dialog_cache import DialogCache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return [self.calls]
+
+
+async def test_fresh_list_is_served_from_cache():
+    cache = DialogCache(ttl=60, stale_ttl=60)
+    loader = Loader()
+
+    assert await cache.get(1, loader) == [1]
+    assert await cache.get(1, loader) == [1]
+    assert loader.calls == 1
+
+
+async def test_stale_list_is_served_while_refreshing():
+    cache = DialogCache(ttl=0, stale_ttl=60)
+    loader = Loader()
+
+    assert await cache.get(1, loader) == [1]
+    assert await cache.get(1, loader) == [1]
+    await asyncio.sleep(0)
+
+    assert loader.calls == 2
+    assert (await cache.cache.get(1))["value"] == [2]
+    await cache.close()
+
+
+async def test_invalidate_drops_list_and_pending_refresh():
+    cache = DialogCache(ttl=60, stale_ttl=60)
+    loader = Loader()
+    await cache.get(1, loader)
+
+    await cache.invalidate(1)
+
+    assert await cache.peek(1) is None
+    assert await cache.get(1, loader) == [2]
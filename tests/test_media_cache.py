@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from telethon.tl.types import Photo, PhotoSize
+
+from app.core.media_cache import MediaCache, MediaFile, MediaStream
+from app.services.telegram import TelegramAuthService
+from benchmarks.fake_telegram import FakeClient, FakePool
+
+
+def store(cache: MediaCache, key: str, data: bytes) -> str:
+    with cache.temp_file() as temp:
+        temp.write(data)
+    return cache.commit(key, temp.name)
+
+
+def test_least_recently_served_files_are_evicted(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=10)
+    store(cache, "a", b"1234")
+    store(cache, "b", b"1234")
+    cache.get("a")
+    store(cache, "c", b"1234")
+
+    assert cache.get("b") is None
+    assert open(cache.get("a"), "rb").read() == b"1234"
+    assert cache.get("c")
+
+
+def test_only_paths_inside_the_directory_are_contained(tmp_path):
+    cache = MediaCache(str(tmp_path / "media"), max_bytes=100)
+    path = store(cache, "a", b"1234")
+    os.symlink("/etc/passwd", tmp_path / "media" / "link")
+
+    assert cache.contains(path)
+    assert not cache.contains(str(tmp_path / "media" / ".." / "other"))
+    assert not cache.contains(str(tmp_path / "media" / "link"))
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    store(MediaCache(str(tmp_path), max_bytes=100), "a", b"1234")
+    (tmp_path / ".download-partial").write_bytes(b"12")
+
+    cache = MediaCache(str(tmp_path), max_bytes=100)
+    assert cache.get("a")
+    assert not (tmp_path / ".download-partial").exists()
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    sizes = [PhotoSize(type="m", w=320, h=240, size=10), PhotoSize(type="x", w=800, h=600, size=100)]
+    message = client.message(5)
+    message.media = message.photo = Photo(id=7, access_hash=0, file_reference=b"", date=None, sizes=sizes, dc_id=2)
+    return client
+
+
+@pytest.fixture
+def service(client, db, sessions, tmp_path):
+    media = MediaCache(str(tmp_path), max_bytes=1000)
+    return TelegramAuthService(FakePool(client), db, sessions=sessions, media=media)
+
+
+async def test_thumbnail_is_downloaded_once(service, client):
+    media = await service.get_media(1, "session", 10, 5, size="small")
+    assert isinstance(media, MediaFile)
+    assert open(media.path, "rb").read() == b"thumb"
+
+    again = await service.get_media(1, "session", 10, 5, size="small")
+    assert again.path == media.path
+    assert list(client.calls) == [{"method": "get_messages", "ids": 5}, {"method": "download_media", "thumb": "m"}]
+
+
+async def test_original_is_cached_while_streamed(service, client):
+    media = await service.get_media(1, "session", 10, 5)
+    assert isinstance(media, MediaStream)
+    assert media.media_type == "image/jpeg"
+    assert b"".join([chunk async for chunk in media.chunks]) == b"original"
+
+    media = await service.get_media(1, "session", 10, 5)
+    assert isinstance(media, MediaFile)
+    assert os.path.getsize(media.path) == len(b"original")
+    assert [call["method"] for call in client.calls] == ["get_messages", "iter_download"]
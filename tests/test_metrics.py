@@ -0,0 +1,21 @@
+from app.core.metrics import TELEGRAM_CALL_DURATION, timed
+
+
+def test_requests_are_recorded_by_route_template(client):
+    client.get("/telegram/chats/12345/messages")
+
+    body = client.get("/metrics").text
+
+    assert 'route="/telegram/chats/{chat_id}/messages"' in body
+    assert "12345" not in body
+    assert "db_query_duration_seconds_count" in body
+
+
+def test_timed_records_the_outcome():
+    try:
+        with timed(TELEGRAM_CALL_DURATION, method="test_method"):
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert TELEGRAM_CALL_DURATION.labels(method="test_method", outcome="error")._sum.get() > 0
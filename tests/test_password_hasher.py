@@ -0,0 +1,43 @@
+import asyncio
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core import config
+from app.core.security import PasswordHasher
+
+
+async def test_hashes_in_worker_processes():
+    hasher = PasswordHasher(workers=1)
+    try:
+        hashed = await hasher.hash("secret")
+
+        assert await hasher.verify_and_update("secret", hashed) == (True, None)
+        assert (await hasher.verify_and_update("wrong", hashed))[0] is False
+    finally:
+        hasher.close()
+
+
+async def test_outdated_rounds_are_rehashed():
+    hasher = PasswordHasher(workers=1)
+    try:
+        other_rounds = config.BCRYPT_ROUNDS + 1
+        other_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=other_rounds).hash("secret")
+        valid, new_hash = await hasher.verify_and_update("secret", other_hash)
+
+        assert valid
+        assert new_hash is not None
+    finally:
+        hasher.close()
+
+
+async def test_sheds_load_beyond_queue_limit():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        results = await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], HTTPException)
+        assert results[1].status_code == 503
+    finally:
+        hasher.close()
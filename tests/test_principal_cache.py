@@ -0,0 +1,69 @@
+import os
+import time
+
+from app.core.cache import Cache, SQLiteBackend
+from app.core.principal_cache import Principal, PrincipalCache, TelegramAccountState
+
+
+async def test_cached_principal_expires_with_its_token():
+    cache = PrincipalCache(ttl=60)
+    generation = await cache.generation(1)
+    await cache.set("live", Principal(id=1, email="a@example.com"), time.time() + 60, generation)
+    await cache.set("expired", Principal(id=1, email="a@example.com"), time.time() - 1, generation)
+
+    assert (await cache.get("live")).id == 1
+    assert await cache.get("expired") is None
+
+
+async def test_invalidate_user_drops_all_of_its_tokens():
+    cache = PrincipalCache()
+    expires_at = time.time() + 60
+    await cache.set("first", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+    await cache.set("second", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+    await cache.set("other", Principal(id=2, email="b@example.com"), expires_at, await cache.generation(2))
+
+    await cache.invalidate_user(1)
+
+    assert await cache.get("first") is None
+    assert await cache.get("second") is None
+    assert (await cache.get("other")).id == 2
+
+
+async def test_least_recently_used_token_is_evicted():
+    # Each user's generation takes an entry of its own
+    cache = PrincipalCache(max_size=4)
+    expires_at = time.time() + 60
+    await cache.set("a", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+    await cache.set("b", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+    await cache.get("a")
+    await cache.set("c", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+    await cache.set("d", Principal(id=1, email="a@example.com"), expires_at, await cache.generation(1))
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+
+
+async def test_invalidation_during_the_load_leaves_the_entry_stale():
+    cache = PrincipalCache()
+    generation = await cache.generation(1)
+    # The account changes after the loader took the generation but before
+    # it read the account
+    await cache.invalidate_user(1)
+    await cache.set("token", Principal(id=1, email="a@example.com"), time.time() + 60, generation)
+
+    assert await cache.get("token") is None
+
+
+async def test_session_strings_never_reach_the_shared_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    first, second = (PrincipalCache(Cache(backend, "principal")) for _ in range(2))
+    principal = Principal(id=1, email="a@example.com", telegram_account=TelegramAccountState("secret-session", True))
+    await first.set("token", principal, time.time() + 60, await first.generation(1))
+
+    assert await first.get("token") == principal
+    # Another worker has to load the session string itself
+    assert await second.get("token") is None
+
+    await backend.close()
+    assert b"secret-session" not in (tmp_path / "cache.db").read_bytes()
+    assert os.stat(tmp_path / "cache.db").st_mode & 0o777 == 0o600
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+from telethon.errors import FloodWaitError
+
+from app.core.rate_limit import TelegramScheduler, TokenBucket
+
+
+def flood_wait(seconds: int) -> FloodWaitError:
+    return FloodWaitError(request=None, capture=seconds)
+
+
+def test_token_bucket_queues_callers_beyond_the_burst():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+async def test_short_flood_wait_is_retried():
+    scheduler = TelegramScheduler(max_flood_wait=5)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise flood_wait(0)
+        return "ok"
+
+    assert await scheduler.call(1, call) == "ok"
+    assert attempts == 2
+
+
+async def test_long_flood_wait_surfaces_retry_after():
+    scheduler = TelegramScheduler(max_flood_wait=5)
+
+    async def call():
+        raise flood_wait(120)
+
+    with pytest.raises(HTTPException) as error:
+        await scheduler.call(1, call)
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "120"
+
+    # The account stays blocked without another round trip
+    with pytest.raises(HTTPException):
+        await scheduler.acquire(1)
+    await scheduler.acquire(2)
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import check_dialect
+from app.migrations import run_migrations
+from app.repositories.telegram import TelegramAccountRepository
+
+
+async def test_upsert_creates_then_overwrites_the_account(db):
+    repo = TelegramAccountRepository(db)
+
+    created = await repo.upsert_telegram_account("first", 1, False)
+    updated = await repo.upsert_telegram_account("second", 1, True)
+
+    assert updated.id == created.id
+    assert (updated.session_string, updated.is_telegram_auth) == ("second", True)
+    account = await repo.get_telegram_account(1)
+    assert (account.session_string, account.is_telegram_auth) == ("second", True)
+
+
+async def test_deleting_a_missing_account_is_a_no_op(db):
+    repo = TelegramAccountRepository(db)
+    await repo.upsert_telegram_account("session", 1, True)
+
+    assert (await repo.delete_telegram_account(1)).user_id == 1
+    assert await repo.delete_telegram_account(1) is None
+
+
+def test_databases_without_upserts_are_refused_at_startup():
+    check_dialect(SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+    with pytest.raises(RuntimeError, match="'mysql'"):
+        check_dialect(SimpleNamespace(dialect=SimpleNamespace(name="mysql")))
+
+
+@pytest.fixture
+async def legacy_engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE telegram_accounts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "session_string VARCHAR NOT NULL, is_telegram_auth BOOLEAN)"))
+        await conn.execute(text(
+            "INSERT INTO telegram_accounts (user_id, session_string) VALUES (1, 'old'), (1, 'new'), (2, 'other')"))
+    yield engine
+    await engine.dispose()
+
+
+async def test_migration_dedupes_accounts_and_adds_unique_index(legacy_engine):
+    for _ in range(2):
+        async with legacy_engine.begin() as conn:
+            await run_migrations(conn)
+
+    async with legacy_engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT user_id, session_string FROM telegram_accounts ORDER BY user_id"))).all()
+        assert rows == [(1, "new"), (2, "other")]
+        with pytest.raises(Exception, match="UNIQUE"):
+            await conn.execute(text(
+                "INSERT INTO telegram_accounts (user_id, session_string) VALUES (1, 'again')"))
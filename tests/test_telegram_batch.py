@@ -0,0 +1,48 @@
+from app.core import config
+from app.core.rate_limit import TelegramScheduler
+from app.services.telegram import TelegramAuthService
+from benchmarks.fake_telegram import FakeClient, FakePool, User
+
+
+async def collect(service, chats):
+    return {result["chat_id"]: result async for result in service.iter_message_batch(1, "session", chats)}
+
+
+async def test_batch_reports_each_chat_on_one_borrowed_client(db, sessions, monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BATCH_CONCURRENCY", 2)
+    client = FakeClient(latency=0.01)
+    client.errors[13] = ValueError("Chat not found")
+    pool = FakePool(client)
+    service = TelegramAuthService(
+        pool, db, scheduler=TelegramScheduler(global_burst=100, account_burst=100), sessions=sessions)
+
+    results = await collect(service, [(1, 3), (2, 1), (3, 2), (4, 1), (13, 5)])
+
+    assert pool.borrows == 1
+    assert client.max_active == 2
+    assert [m["id"] for m in results[1]["messages"]] == [250, 249, 248]
+    assert len(results[3]["messages"]) == 2
+    assert results[13]["error"] == {"status_code": 400, "detail": "Chat not found"}
+
+
+async def test_slow_chat_times_out_without_failing_the_batch(db, sessions, monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BATCH_CHAT_TIMEOUT", 0.1)
+    client = FakeClient()
+    client.delays[99] = 10
+    service = TelegramAuthService(FakePool(client), db, sessions=sessions)
+
+    results = await collect(service, [(99, 5), (1, 5)])
+
+    assert results[99]["error"]["status_code"] == 504
+    assert len(results[1]["messages"]) == 5
+
+
+async def test_chats_resolving_the_same_new_sender_all_succeed(db, sessions):
+    client = FakeClient()
+    for message in client.history:
+        message.sender = User(1, "Ada", "Lovelace", "ada")
+    service = TelegramAuthService(FakePool(client), db, sessions=sessions)
+
+    results = await collect(service, [(chat_id, 2) for chat_id in range(1, 6)])
+
+    assert all(result["messages"][0]["sender"] == "Ada Lovelace" for result in results.values())
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import config
+from app.core.cursor import decode_cursor, encode_cursor
+from app.repositories.entity import TelegramEntityRepository
+from app.services.telegram import TelegramAuthService
+from benchmarks.fake_telegram import FakeClient, FakePool, Message, User
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def service(client, db, sessions):
+    return TelegramAuthService(FakePool(client), db, sessions=sessions)
+
+
+async def test_walks_history_backwards_with_next_cursor(service):
+    page = await service.get_messages(1, 10, "session", limit=100)
+    assert [m["id"] for m in page["messages"]][:2] == [250, 249]
+
+    position = decode_cursor(page["next_cursor"])
+    page = await service.get_messages(1, 10, "session", limit=100, **position)
+    assert page["messages"][0]["id"] == 150
+
+    position = decode_cursor(page["next_cursor"])
+    page = await service.get_messages(1, 10, "session", limit=100, **position)
+    assert len(page["messages"]) == 50
+    assert page["next_cursor"] is None
+
+
+async def test_poll_cursor_returns_only_new_messages(service):
+    page = await service.get_messages(1, 10, "session", limit=10, after_id=245)
+
+    assert [m["id"] for m in page["messages"]] == [250, 249, 248, 247, 246]
+    assert decode_cursor(page["poll_cursor"]) == {"after_id": 250}
+
+    page = await service.get_messages(1, 10, "session", limit=10, after_id=250)
+    assert page["messages"] == []
+    assert decode_cursor(page["poll_cursor"]) == {"after_id": 250}
+
+
+@pytest.mark.parametrize("position", [{"after_id": "x"}, {"before_id": -1}, {"after_id": True}, {"offset": 1}])
+def test_crafted_cursors_are_rejected(position):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor(position))
+    assert (error.value.status_code, error.value.detail) == (400, "Invalid cursor")
+
+
+async def test_repeated_reads_are_served_from_the_store(service, client):
+    first = await service.get_messages(1, 10, "session", limit=50)
+    second = await service.get_messages(1, 10, "session", limit=50)
+
+    assert first == second
+    assert len(client.calls) == 1
+
+
+async def test_concurrent_first_reads_of_a_chat_both_store_it(client, sessions):
+    async with sessions() as first_db, sessions() as second_db:
+        first, second = (TelegramAuthService(FakePool(client), db, sessions=sessions) for db in (first_db, second_db))
+        pages = await asyncio.gather(
+            first.get_messages(1, 10, "session", limit=20),
+            second.get_messages(1, 10, "session", limit=30))
+
+    assert [len(page["messages"]) for page in pages] == [20, 30]
+
+
+async def test_coalesced_read_outlives_the_caller_that_started_it(sessions):
+    client = FakeClient()
+    client.gate = asyncio.Event()
+    async with sessions() as first_db, sessions() as second_db:
+        first, second = (
+            asyncio.ensure_future(TelegramAuthService(FakePool(client), db, sessions=sessions).get_messages(
+                1, 10, "session", limit=20))
+            for db in (first_db, second_db))
+        await asyncio.sleep(0.01)
+
+        # The caller that started the read disconnects, and its request
+        # session is about to close: the read must not be running on it
+        assert not first_db.in_transaction()
+        first.cancel()
+        client.gate.set()
+
+        page = await second
+    assert len(page["messages"]) == 20
+    assert len(client.calls) == 1
+
+
+async def test_stale_chat_only_fetches_newer_messages(service, client, monkeypatch):
+    await service.get_messages(1, 10, "session", limit=50)
+
+    client.history.insert(0, Message(251))
+    monkeypatch.setattr(config, "TELEGRAM_MESSAGE_SYNC_INTERVAL", 0)
+    page = await service.get_messages(1, 10, "session", limit=50)
+
+    assert client.calls[-1]["min_id"] == 250
+    assert [m["id"] for m in page["messages"]][:2] == [251, 250]
+
+
+async def test_export_streams_history_in_chunks_and_resumes(service, client, monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_EXPORT_CHUNK_SIZE", 100)
+
+    chunks = [chunk async for chunk in service.iter_export(1, "session", 10)]
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert chunks[0][0]["id"] == 1 and chunks[-1][-1]["id"] == 250
+
+    client.calls.clear()
+    chunks = [chunk async for chunk in service.iter_export(1, "session", 10, from_id=240)]
+    assert [m["id"] for m in chunks[0]] == list(range(241, 251))
+    assert client.calls[0]["min_id"] == 240
+
+
+ADA = User(1, "Ada", "Lovelace", "ada")
+
+
+async def test_sender_names_are_cached_per_account(service, client):
+    client.history[0].sender = ADA
+    page = await service.get_messages(1, 10, "session", limit=5, after_id=245)
+    assert page["messages"][0]["sender"] == "Ada Lovelace"
+
+    # Later responses without the sender attached still get its name
+    client.history[0].sender = None
+    messages = await service._fetch_messages(1, "session", 10, limit=1)
+    assert messages[0]["sender"] == "Ada Lovelace"
+
+
+async def test_messages_are_served_when_caching_their_senders_fails(service, client, monkeypatch):
+    async def fail(self, user_id, entities):
+        raise HTTPException(status_code=500, detail="database is locked")
+
+    monkeypatch.setattr(TelegramEntityRepository, "save_entities", fail)
+    client.history[0].sender = ADA
+
+    messages = await service._fetch_messages(1, "session", 10, limit=1)
+    assert messages[0]["sender"] == "Ada Lovelace"
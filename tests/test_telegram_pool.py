@@ -0,0 +1,56 @@
+import pytest
+
+from app.core.telegram_pool import TelegramClientPool
+from benchmarks.fake_telegram import FakeClient
+
+
+@pytest.fixture
+def pool():
+    pool = TelegramClientPool(api_id=1, api_hash="hash", max_clients=2)
+    pool._new_client = lambda session_string, session=None: FakeClient(session_string=session_string)
+    return pool
+
+
+async def test_client_is_reused_between_borrows(pool):
+    async with pool.client(1, "session") as first:
+        pass
+    async with pool.client(1, "session") as second:
+        pass
+
+    assert first is second
+    assert first.connects == 1
+    await pool.close()
+
+
+async def test_reconnects_dropped_client(pool):
+    async with pool.client(1, "session") as client:
+        client.connected = False
+    async with pool.client(1, "session") as client:
+        assert client.is_connected()
+
+    assert client.connects == 2
+    await pool.close()
+
+
+async def test_evicts_least_recently_used_idle_client(pool):
+    async with pool.client(1, "a") as first:
+        pass
+    async with pool.client(2, "b"):
+        pass
+    async with pool.client(3, "c"):
+        pass
+
+    assert not first.is_connected()
+    assert list(pool._clients) == [2, 3]
+    await pool.close()
+
+
+async def test_new_session_replaces_pooled_client(pool):
+    async with pool.client(1, "old") as old:
+        pass
+    async with pool.client(1, "new") as new:
+        pass
+
+    assert old is not new
+    assert not old.is_connected()
+    await pool.close()
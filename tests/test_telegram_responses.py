@@ -0,0 +1,92 @@
+import orjson
+import pytest
+
+from app.core.dialog_cache import DialogCache
+from app.core.principal_cache import Principal, TelegramAccountState
+from app.deps import get_current_user, get_telegram_service
+from app.main import app
+from app.services.telegram import TelegramAuthService
+
+
+CHATS = [{"id": 1, "name": "Ada", "type": "User",
+          "last_message": {"id": 7, "text": "hi", "date": None, "sender_id": 1, "sender": "Ada"}}]
+
+
+class FakeTelegramService:
+    chats_etag = staticmethod(TelegramAuthService.chats_etag)
+    messages_etag = staticmethod(TelegramAuthService.messages_etag)
+
+    def __init__(self):
+        self.dialogs = DialogCache()
+        self.calls = 0
+
+    async def get_chats(self, user_id, session_string):
+        self.calls += 1
+        return await self.dialogs.get(user_id, self._load)
+
+    async def _load(self):
+        return CHATS
+
+    async def iter_message_batch(self, user_id, session_string, chats):
+        for chat_id, limit in chats:
+            yield {"chat_id": chat_id, "messages": [{"id": id, "text": "hi" * 100} for id in range(limit)]}
+
+    async def get_messages(self, user_id, chat_id, session_string, **kwargs):
+        self.calls += 1
+        return {"messages": [{"id": 7, "text": "hi", "date": "2024-01-01T00:00:00+00:00",
+                              "sender_id": 1, "sender": "Ada", "media": False}],
+                "next_cursor": None, "poll_cursor": "x"}
+
+
+@pytest.fixture
+def service(client):
+    service = FakeTelegramService()
+    user = Principal(id=1, email="a@example.com", telegram_account=TelegramAccountState("session", True))
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_telegram_service] = lambda: service
+    yield service
+    app.dependency_overrides.clear()
+
+
+def test_unchanged_chats_are_not_modified_without_a_fetch(client, service):
+    response = client.get("/telegram/chats")
+    etag = response.headers["ETag"]
+
+    response = client.get("/telegram/chats", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert service.calls == 1
+
+
+def test_changed_messages_get_a_new_etag(client, service):
+    etag = client.get("/telegram/chats/1/messages").headers["ETag"]
+    assert client.get("/telegram/chats/1/messages", headers={"If-None-Match": etag}).status_code == 304
+
+    response = client.get("/telegram/chats/1/messages", headers={"If-None-Match": 'W/"other"'})
+    assert response.status_code == 200
+    assert response.json()["messages"][0]["id"] == 7
+
+
+def test_large_chat_lists_are_typed_and_compressed(client, service, monkeypatch):
+    chats = [{**CHATS[0], "id": id, "last_message": {**CHATS[0]["last_message"], "date": "2024-01-01T00:00:00Z"}}
+             for id in range(500)]
+    monkeypatch.setattr(service, "_load", lambda: _result(chats))
+
+    response = client.get("/telegram/chats", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.json()) == 500
+    assert response.json()[0]["last_message"]["date"] == "2024-01-01T00:00:00Z"
+
+
+def test_ndjson_streams_are_not_compressed(client, service):
+    response = client.post("/telegram/messages/batch", headers={"Accept-Encoding": "gzip"},
+                           json={"chats": [{"chat_id": 1, "limit": 50}, {"chat_id": 2, "limit": 50}]})
+
+    assert response.headers["Content-Encoding"] == "identity"
+    assert [line["chat_id"] for line in map(orjson.loads, response.iter_lines())] == [1, 2]
+
+
+async def _result(value):
+    return value
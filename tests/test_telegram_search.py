@@ -0,0 +1,45 @@
+import pytest
+
+from app.repositories.message import TelegramMessageRepository
+
+
+def message(id: int, text: str) -> dict:
+    return {
+        'id': id,
+        'text': text,
+        'date': '2024-01-01T00:00:00+00:00',
+        'sender_id': 1,
+        'sender': 'Oleg',
+        'media': False
+    }
+
+
+@pytest.fixture
+async def repo(db):
+    repo = TelegramMessageRepository(db)
+    await repo.save_messages(1, -1001, [message(1, "Привіт, як справи?"), message(2, "meeting at noon")])
+    await repo.save_messages(1, 42, [message(1, "noon is too early for a meeting")])
+    await repo.save_messages(2, 42, [message(1, "meeting tomorrow")])
+    return repo
+
+
+async def test_search_ranks_matches_of_the_account(repo):
+    results = await repo.search_messages(1, "meeting")
+
+    assert sorted((row.chat_id, row.message_id) for row, _, _ in results) == [(-1001, 2), (42, 1)]
+    assert all(snippet.count("<mark>meeting</mark>") == 1 for _, snippet, _ in results)
+
+
+async def test_search_filters_by_chat_and_matches_prefixes(repo):
+    results = await repo.search_messages(1, "noon", chat_id=42)
+    assert [(row.chat_id, row.message_id) for row, _, _ in results] == [(42, 1)]
+
+    results = await repo.search_messages(1, "приві", chat_id=-1001)
+    assert [row.message_id for row, _, _ in results] == [1]
+
+
+async def test_search_index_follows_edits(repo):
+    await repo.save_messages(1, 42, [message(1, "rescheduled")])
+
+    assert [row.chat_id for row, _, _ in await repo.search_messages(1, "meeting")] == [-1001]
+    assert len(await repo.search_messages(1, "rescheduled")) == 1
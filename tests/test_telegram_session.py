@@ -0,0 +1,60 @@
+import os
+from datetime import datetime, UTC
+
+from telethon.crypto import AuthKey
+from telethon.sessions import StringSession
+from telethon.tl.types import InputPeerUser, User
+from telethon.tl.types.updates import State
+
+from app.core.telegram_session import TelegramSessionStore
+
+
+def session_string():
+    session = StringSession()
+    session.set_dc(2, "149.154.167.51", 443)
+    session.auth_key = AuthKey(os.urandom(256))
+    return session.save()
+
+
+async def test_entities_and_update_state_survive_a_new_session(sessions):
+    store = TelegramSessionStore(sessions, flush_interval=60)
+    string = session_string()
+
+    session = await store.load(1, string)
+    session.process_entities([User(id=5, access_hash=77, username="Ada", first_name="Ada")])
+    session.set_update_state(0, State(pts=10, qts=2, date=datetime(2024, 1, 1, tzinfo=UTC), seq=3, unread_count=0))
+
+    # Within the flush interval nothing is written yet
+    await store.flush(session)
+    assert (await store.load(1, string)).get_update_state(0) is None
+
+    await store.flush(session, force=True)
+    assert not session.dirty
+
+    restored = await store.load(1, string)
+    assert restored.get_input_entity(5) == InputPeerUser(5, 77)
+    assert restored.get_input_entity("ada") == InputPeerUser(5, 77)
+    assert restored.get_update_state(0).pts == 10
+
+
+async def test_data_of_another_auth_key_is_not_loaded(sessions):
+    store = TelegramSessionStore(sessions)
+    session = await store.load(1, session_string())
+    session.process_entities([User(id=5, access_hash=77, first_name="Ada")])
+    await store.flush(session, force=True)
+
+    other = await store.load(1, session_string())
+    assert other._entities == set()
+
+
+async def test_logged_out_session_is_deleted(sessions):
+    store = TelegramSessionStore(sessions)
+    string = session_string()
+    session = await store.load(1, string)
+    session.process_entities([User(id=5, access_hash=77, first_name="Ada")])
+    await store.flush(session, force=True)
+
+    session.delete()
+    await store.flush(session, force=True)
+
+    assert (await store.load(1, string))._entities == set()
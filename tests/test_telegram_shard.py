@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.dialog_cache import DialogCache
+from app.core.media_cache import MediaCache
+from app.core.sharding import HashRing, ShardRouter, read_frame, write_frame
+from app.services.telegram_shard import ShardedTelegramService, ShardedUpdateHub, TelegramShardServer
+from app.services.telegram_updates import TelegramUpdateHub
+from benchmarks.fake_telegram import FakePool
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b"])
+
+    owners = {key: before.node(key) for key in range(1000)}
+    assert set(owners.values()) == {"a", "b", "c"}
+    assert all(after.node(key) == owner for key, owner in owners.items() if owner != "c")
+
+
+def test_members_are_listed_at_most_once_per_ttl(tmp_path):
+    (tmp_path / "a.sock").touch()
+    router = ShardRouter(str(tmp_path), name="a.sock", members_ttl=60)
+    assert all(router.owns(user_id) for user_id in range(100))
+
+    (tmp_path / "b.sock").touch()
+    assert all(router.owns(user_id) for user_id in range(100))
+
+    router.refresh()
+    assert not all(router.owns(user_id) for user_id in range(100))
+
+
+@pytest.fixture
+async def shards(tmp_path, sessions):
+    owner = ShardRouter(str(tmp_path), name="owner.sock")
+    updates = TelegramUpdateHub(FakePool(), DialogCache(), sessions=sessions)
+    server = TelegramShardServer(owner, FakePool(), sessions=sessions, updates=updates)
+    await server.start()
+    yield ShardRouter(str(tmp_path), name="other.sock"), server
+    await server.close()
+
+
+class LocalService:
+    async def get_chats(self, user_id, session_string):
+        return "local"
+
+
+def user_owned_by(router: ShardRouter, name: str) -> int:
+    return next(user_id for user_id in range(1000) if router.owner(user_id).endswith(name))
+
+
+async def test_calls_are_forwarded_to_the_owner(shards, tmp_path):
+    router, _ = shards
+    # The caller's own socket takes part in the ring too
+    (tmp_path / "other.sock").touch()
+    service = ShardedTelegramService(LocalService(), router)
+
+    user_id = user_owned_by(router, "owner.sock")
+    chunks = [chunk async for chunk in service.iter_export(user_id, "session", 10, from_id=240)]
+    assert [m["id"] for m in chunks[0]] == list(range(241, 251))
+
+    with pytest.raises(HTTPException) as error:
+        await service.get_media(user_id, "session", 10, 5)
+    assert (error.value.status_code, error.value.detail) == (404, "Message has no media")
+
+    assert await service.get_chats(user_owned_by(router, "other.sock"), "session") == "local"
+
+
+async def test_update_subscriptions_are_held_by_the_owner(shards, tmp_path):
+    router, server = shards
+    (tmp_path / "other.sock").touch()
+    local = TelegramUpdateHub(None, DialogCache())
+    hub = ShardedUpdateHub(local, router)
+
+    user_id = user_owned_by(router, "owner.sock")
+    async with hub.subscribe(user_id, "session") as updates:
+        assert local._subscriptions == {}
+        server.updates._subscriptions[user_id].publish({"type": "new_message", "chat_id": 10})
+        assert await asyncio.wait_for(updates.get(), 1) == {"type": "new_message", "chat_id": 10}
+
+    # The owner unsubscribes once the relaying socket went away
+    for _ in range(100):
+        if not server.updates._subscriptions:
+            break
+        await asyncio.sleep(0.01)
+    assert server.updates._subscriptions == {}
+
+
+async def test_files_outside_the_media_cache_are_refused(tmp_path):
+    async def handle(reader, writer):
+        await read_frame(reader)
+        await write_frame(writer, {'file': {'path': '/etc/passwd', 'media_type': 'text/plain', 'filename': 'x'}})
+        writer.close()
+
+    # A peer answering for every account with a file of its choosing
+    server = await asyncio.start_unix_server(handle, path=str(tmp_path / "owner.sock"))
+    local = LocalService()
+    local.media = MediaCache(str(tmp_path / "media"), 1024)
+    service = ShardedTelegramService(local, ShardRouter(str(tmp_path), name="other.sock"))
+
+    with pytest.raises(HTTPException) as error:
+        await service.get_media(1, "session", 10, 5)
+    assert error.value.status_code == 502
+    server.close()
+    await server.wait_closed()
+
+
+async def test_shard_directory_must_be_private(tmp_path, sessions):
+    server = TelegramShardServer(ShardRouter(str(tmp_path / "shards"), name="owner.sock"), FakePool(), sessions=sessions)
+    await server.start()
+    assert os.stat(tmp_path / "shards").st_mode & 0o777 == 0o700
+    await server.close()
+
+    os.chmod(tmp_path / "shards", 0o777)
+    with pytest.raises(RuntimeError, match="not writable by others"):
+        await server.start()
+
+
+async def test_sockets_of_other_users_are_refused(shards, monkeypatch):
+    router, _ = shards
+    monkeypatch.setattr(os, "getuid", lambda: 12345)
+
+    with pytest.raises(HTTPException) as error:
+        await ShardedTelegramService(LocalService(), router).get_chats(1, "session")
+    assert error.value.status_code == 502
+
+
+async def test_dead_owner_is_dropped_from_the_ring(shards, tmp_path):
+    router, server = shards
+    await server.close()
+    # Not listening anymore, as after a crash
+    (tmp_path / "owner.sock").touch()
+
+    service = ShardedTelegramService(LocalService(), router)
+    assert await service.get_chats(1, "session") == "local"
+    assert not (tmp_path / "owner.sock").exists()
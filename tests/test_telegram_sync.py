@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from app.core.dialog_cache import DialogCache
+from app.services.telegram_sync import TelegramSyncWorker
+
+
+def make_worker(sessions, **options):
+    worker = TelegramSyncWorker(None, DialogCache(), sessions, **options)
+    worker.synced = []
+
+    async def sync_account(user_id, session_string):
+        worker.synced.append(user_id)
+        await asyncio.sleep(0.05)
+
+    worker._sync_account = sync_account
+    return worker
+
+
+def make_due(worker, user_id, idle: float):
+    worker.touch(user_id, "session")
+    state = worker._accounts[user_id]
+    state.last_active -= idle
+    state.next_sync_at = 0
+
+
+async def test_most_recently_active_accounts_sync_first(sessions):
+    worker = make_worker(sessions, concurrency=1)
+    make_due(worker, 1, idle=300)
+    make_due(worker, 2, idle=10)
+    make_due(worker, 3, idle=100)
+
+    await worker.start()
+    await asyncio.sleep(0.3)
+    await worker.close()
+
+    assert worker.synced == [2, 3, 1]
+    assert all(state.next_sync_at > time.monotonic() for state in worker._accounts.values())
+
+
+async def test_failed_sync_backs_off_and_honours_retry_after(sessions):
+    worker = make_worker(sessions, interval=60)
+
+    async def sync_account(user_id, session_string):
+        raise HTTPException(status_code=429, detail="Slow down", headers={"Retry-After": "300"})
+
+    worker._sync_account = sync_account
+    make_due(worker, 1, idle=0)
+
+    await worker.start()
+    await asyncio.sleep(0.1)
+    await worker.close()
+
+    state = worker._accounts[1]
+    assert state.failures == 1
+    assert state.next_sync_at - time.monotonic() > 290
+
+
+async def test_inactive_accounts_are_dropped(sessions):
+    worker = make_worker(sessions, active_window=60)
+    make_due(worker, 1, idle=120)
+
+    await worker.start()
+    await asyncio.sleep(0.1)
+    await worker.close()
+
+    assert worker.synced == []
+    assert 1 not in worker._accounts
+
+
+async def test_close_lets_running_syncs_finish(sessions):
+    worker = make_worker(sessions)
+    make_due(worker, 1, idle=0)
+
+    await worker.start()
+    await asyncio.sleep(0.01)
+    running = set(worker._running)
+    await worker.close()
+
+    assert running and all(task.done() and not task.cancelled() for task in running)
@@ -0,0 +1,73 @@
+import asyncio
+
+from app.core.dialog_cache import DialogCache
+from app.repositories.message import TelegramMessageRepository
+from app.services.telegram_updates import TelegramUpdateHub
+from benchmarks.fake_telegram import FakeClient, FakePool, Message
+
+
+class FakeDeletedEvent:
+    chat_id = 10
+    deleted_ids = [5, 6]
+
+
+class FakeEditedEvent:
+    chat_id = 10
+    message = Message(4, text="edited")
+
+
+async def test_sockets_of_an_account_share_one_subscription(sessions):
+    pool = FakePool()
+    hub = TelegramUpdateHub(pool, DialogCache(), sessions=sessions)
+
+    async with hub.subscribe(1, "session") as first, hub.subscribe(1, "session") as second:
+        assert pool.borrows == 1
+        on_deleted = pool.fake_client.handlers[2]
+        await on_deleted(FakeDeletedEvent())
+
+        expected = {"type": "message_deleted", "chat_id": 10, "message_ids": [5, 6]}
+        assert first.get_nowait() == expected
+        assert second.get_nowait() == expected
+
+    await asyncio.sleep(0)
+    assert pool.fake_client.handlers == []
+    assert hub._subscriptions == {}
+
+
+async def test_edits_and_deletions_are_applied_to_the_store(sessions, db):
+    repo = TelegramMessageRepository(db)
+    await repo.save_messages(1, 10, [
+        {"id": id, "text": "original", "date": "2024-01-01T00:00:00+00:00",
+         "sender_id": 1, "sender": "Ada", "media": False}
+        for id in (4, 5, 6)
+    ])
+    pool = FakePool()
+    hub = TelegramUpdateHub(pool, DialogCache(), sessions=sessions)
+
+    async with hub.subscribe(1, "session"):
+        _, on_edited, on_deleted = pool.fake_client.handlers
+        await on_edited(FakeEditedEvent())
+        # Outside channels Telegram does not say which chat lost messages
+        deleted = FakeDeletedEvent()
+        deleted.chat_id = None
+        await on_deleted(deleted)
+
+    rows = await repo.get_messages(1, 10, 10)
+    assert [(row.message_id, row.text, row.sender) for row in rows] == [(4, "edited", "Ada")]
+    assert [row.message_id for row, _, _ in await repo.search_messages(1, "edited")] == [4]
+
+
+async def test_subscription_that_lost_its_connection_is_replaced(sessions):
+    pool = FakePool()
+    hub = TelegramUpdateHub(pool, DialogCache(), sessions=sessions)
+
+    async with hub.subscribe(1, "session") as old:
+        pool.fake_client.disconnected.set_exception(ConnectionError("Connection reset"))
+        update = await asyncio.wait_for(old.get(), 1)
+        assert update == {"type": "error", "detail": "Connection reset"}
+
+        # The old socket has not left yet, but a new one starts afresh
+        pool.fake_client = FakeClient()
+        async with hub.subscribe(1, "session"):
+            assert pool.borrows == 2
+            assert len(pool.fake_client.handlers) == 3
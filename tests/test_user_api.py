@@ -1,15 +1,29 @@
+import pytest
 from fastapi.testclient import TestClient
 
 
-def test_login(client: TestClient):
+@pytest.fixture
+def user(client: TestClient):
     data = {
         "email": "oleg.luzhnyak@gmail.com",
         "password": "oleg123",
     }
-    response = client.post("/auth/login/", json=data)
+    response = client.post("/auth/register", json=data)
+    assert response.status_code in (200, 409)
+    return data
+
+
+def test_login(client: TestClient, user: dict):
+    response = client.post("/auth/login/", json=user)
     assert response.status_code == 200
 
 
+def test_login_wrong_password(client: TestClient, user: dict):
+    data = {**user, "password": "wrong"}
+    response = client.post("/auth/login/", json=data)
+    assert response.status_code == 401
+
+
 def test_login_not_found(client: TestClient):
     data = {
         "email": "not_user@gmail.com",